@@ -1,26 +1,40 @@
-from flask import Flask, jsonify, request, render_template, send_from_directory, redirect, url_for, session
+from flask import Flask, jsonify, request, render_template, send_from_directory, redirect, url_for, session, abort, Response, stream_with_context
 from flask_cors import CORS
+from flask_compress import Compress
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_wtf.csrf import CSRFProtect, generate_csrf, validate_csrf
 from config import Config
+from json_provider import ORJSONProvider
+from cache_utils import LRUCache, TTLCache
+from sqlalchemy import select, insert, update, func, tuple_, type_coerce, cast, extract, desc, or_, and_, exists, literal_column, Date
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import raiseload
 import uuid
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import os
 import re
+import json
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+from http.cookiejar import DefaultCookiePolicy
+from email.message import Message as EmailMessage
+from lxml import html as lxml_html
+from lxml.etree import XMLSyntaxError
 import html
+import io
 import hashlib
+import threading
+from contextlib import nullcontext
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.utils import secure_filename
 
-from PyPDF2 import PdfReader
-import io
-try:
-    from docx import Document as DocxDocument
-except ImportError:
-    DocxDocument = None
 
 # Initialize Flask app
 app = Flask(__name__, static_folder='static')
+app.json = ORJSONProvider(app)
 
 # Configure app based on environment
 from config import config
@@ -40,6 +54,7 @@ from database import db, init_db
 db = init_db(app)
 
 CORS(app)
+Compress(app)
 
 # CSRF Protection
 csrf = CSRFProtect(app)
@@ -75,12 +90,16 @@ limiter = Limiter(
 limiter.init_app(app)
 
 # Import models after db initialization
-from models import Conversation, Message, Attachment, Project
+from models import (
+    Conversation, Message, Attachment, ContextDocument, Project, ChatJob, LLMUsageLog, LLMErrorLog,
+    IPWhitelist, IPUsageSummary, FreeAccessLog, utcnow
+)
 from context_service import ContextService
+from document_service import DocxDocument, extract_pdf_text, extract_docx_text, run_extraction, count_words
 from llm_service import LLMService
 
 # Initialize authentication
-from auth import auth
+from auth import auth, FreeAccessManager, current_user_id
 from security_utils import (
     require_conversation_access, require_message_access, require_project_access,
     require_context_item_access, get_user_identity, check_conversation_access,
@@ -90,6 +109,87 @@ auth.init_app(app)
 
 llm_service = LLMService()
 
+# Formatted LLM history per conversation, stored as
+# (updated_at, messages, (timestamp, id) of the last message, message rows
+# read). Messages are append-only and adding one bumps updated_at, so a
+# matching updated_at means the cached history is current, and a stale entry
+# usually only lacks the messages after its last one. Timestamps are taken
+# before commit, though, so a concurrent insert can land behind the cached
+# tail; the row count against message_count catches that and forces a full
+# reload.
+conversation_history_cache = LRUCache(maxsize=int(os.getenv('HISTORY_CACHE_SIZE', '256')))
+
+def get_conversation_history(conversation):
+    """Conversation messages in LLM API format; returns a list the caller may modify"""
+    cached = conversation_history_cache.get(conversation.id)
+    if cached is not None and cached[0] == conversation.updated_at:
+        return list(cached[1])
+    
+    query = (
+        select(Message.role, Message.content, Message.timestamp, Message.id)
+        .where(Message.conversation_id == conversation.id)
+        .order_by(Message.timestamp, Message.id)
+    )
+    rows = None
+    if cached is not None:
+        # Each turn adds messages, so fetch only the ones after the cached
+        # tail instead of reloading the whole conversation
+        history, last_key, count = cached[1], cached[2], cached[3]
+        tail_query = query
+        if last_key is not None:
+            tail_query = query.where(keyset_filter(Message.timestamp, Message.id, last_key, descending=False))
+        rows = db.session.execute(tail_query).all()
+        if count + len(rows) != conversation.message_count:
+            rows = None
+    if rows is None:
+        history, last_key, count = [], None, 0
+        rows = db.session.execute(query).all()
+    if rows:
+        history = history + llm_service.format_conversation_for_llm(rows)
+        last_key = (rows[-1].timestamp, rows[-1].id)
+        count += len(rows)
+    conversation_history_cache.set(conversation.id, (conversation.updated_at, history, last_key, count))
+    return list(history)
+
+# Supported formats for Google Speech-to-Text; .ogg and .webm are Opus
+SPEECH_SUPPORTED_FORMATS = frozenset(['flac', 'm4a', 'mp3', 'mp4', 'mpeg', 'mpga', 'oga', 'ogg', 'wav', 'webm'])
+SPEECH_OPUS_FORMATS = frozenset(['ogg', 'webm'])
+SPEECH_CHUNK_SIZE = 16 * 1024  # Bytes per StreamingRecognizeRequest
+SPEECH_MAX_UPLOAD = int(os.getenv('SPEECH_MAX_UPLOAD_MB', '25')) * 1024 * 1024
+# Upper bound on one transcription so a stalled Speech call can't hold a
+# worker thread until Gunicorn kills the whole worker
+SPEECH_TIMEOUT = float(os.getenv('SPEECH_TIMEOUT', '90'))
+
+# Google Speech client and streaming configs, created on first use and
+# shared across requests. The gRPC client is thread-safe, so one channel
+# serves every worker thread.
+_speech_client = None
+_speech_configs = {}
+_speech_client_lock = threading.Lock()
+
+def get_speech_client():
+    global _speech_client
+    if _speech_client is None:
+        with _speech_client_lock:
+            if _speech_client is None:
+                from google.cloud import speech
+                _speech_configs['opus'] = speech.StreamingRecognitionConfig(config=speech.RecognitionConfig(
+                    encoding=speech.RecognitionConfig.AudioEncoding.OGG_OPUS,
+                    sample_rate_hertz=48000,  # Opus is usually 48000 Hz
+                    language_code="en-US",
+                ))
+                _speech_configs['linear16'] = speech.StreamingRecognitionConfig(config=speech.RecognitionConfig(
+                    encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+                    sample_rate_hertz=16000,  # Default for LINEAR16
+                    language_code="en-US",
+                ))
+                _speech_client = speech.SpeechClient()
+    return _speech_client
+
+def get_streaming_config(ext):
+    """Shared StreamingRecognitionConfig for an audio extension (call after get_speech_client)"""
+    return _speech_configs['opus' if ext in SPEECH_OPUS_FORMATS else 'linear16']
+
 # Security configuration validation
 def validate_security_config():
     """Validate critical security configurations on startup"""
@@ -139,9 +239,76 @@ def filter_conversations_by_user(query):
         # 2. OR have same IP but NO user_id (legacy free conversations)
         return query.filter(Conversation.session_id == identity['session_id'])
 
+def conditional_etag(*parts):
+    """Build an ETag from a cheap fingerprint of the data behind a response.
+    
+    Returns (etag, not_modified) where not_modified is a ready 304 response
+    if the client already holds this version, otherwise None.
+    """
+    etag = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    # Flask-Compress tags compressed bodies as "<etag>:<algorithm>"
+    if request.if_none_match.contains(etag) or any(
+            tag.partition(':')[0] == etag for tag in request.if_none_match):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return etag, response
+    return etag, None
+
+# Keyset pagination: opt in with ?limit=N (max PAGE_LIMIT_MAX); follow-up pages
+# pass back the returned next_cursor as ?cursor= (None on the last page). Cursors are
+# "<iso timestamp>_<uuid>" so rows sharing a timestamp aren't skipped.
+PAGE_LIMIT_MAX = 100
+
+def get_page_args():
+    """Parse ?limit= and ?cursor= into (limit, (timestamp, id)).
+    
+    limit is None when the client didn't ask for pagination. Raises
+    ValueError for a malformed cursor.
+    """
+    limit = request.args.get('limit', type=int)
+    if limit is None:
+        return None, None
+    limit = max(1, min(limit, PAGE_LIMIT_MAX))
+    
+    cursor = request.args.get('cursor')
+    if not cursor:
+        return limit, None
+    ts, _, row_id = cursor.partition('_')
+    return limit, (datetime.fromisoformat(ts), uuid.UUID(row_id) if row_id else None)
+
+def encode_cursor(ts, row_id):
+    return f"{ts.isoformat()}_{row_id}"
+
+def split_page(rows, limit, ts_attr):
+    """Trim rows fetched with LIMIT limit + 1 to one page.
+    
+    Returns (page, next_cursor); the extra probe row only tells us whether
+    another page exists, so the last page never points at an empty one.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, ts_attr), last.id)
+
+def keyset_filter(ts_column, id_column, cursor, descending):
+    """WHERE clause selecting the rows after cursor in (ts, id) order"""
+    ts, row_id = cursor
+    if row_id is None:  # bare timestamp cursor
+        return ts_column < ts if descending else ts_column > ts
+    # Bind the cursor values with the columns' types so the id compares as a
+    # UUID (and not as its string form) on every dialect
+    key = tuple_(ts_column, id_column)
+    bound = tuple_(type_coerce(ts, ts_column.type), type_coerce(row_id, id_column.type))
+    return key < bound if descending else key > bound
+
 # File upload configuration
 UPLOAD_FOLDER = os.path.join(os.getcwd(), 'uploads')
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+UPLOAD_COPY_BUFFER = 1024 * 1024  # 1MB copy chunks (Werkzeug's default is 16KB)
+# Room for multipart boundaries and the other form fields around one file
+UPLOAD_FORM_OVERHEAD = 64 * 1024
 ALLOWED_EXTENSIONS = {
     'txt', 'pdf', 'docx', 'doc', 'csv', 
     'jpg', 'jpeg', 'png', 'gif', 'webp',  # For image editing
@@ -162,6 +329,45 @@ def validate_file_size(file):
     file.seek(0)  # Reset to beginning
     return size <= MAX_FILE_SIZE
 
+def max_request_size(limit):
+    """Reject a request whose declared Content-Length exceeds limit bytes with a 413.
+    
+    Runs before the body is parsed, so an oversized upload is refused without
+    spooling any of it; MAX_CONTENT_LENGTH still caps bodies sent without a
+    length.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.content_length is not None and request.content_length > limit:
+                return jsonify({'error': f'Request too large. Maximum size: {limit // (1024*1024)}MB'}), 413
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({'error': f"Request too large. Maximum size: {app.config['MAX_CONTENT_LENGTH'] // (1024*1024)}MB"}), 413
+
+def open_unique_upload(filename):
+    """Create and open a new file in UPLOAD_FOLDER named filename.
+    
+    If that name is taken a random suffix is added, which makes the name
+    unique without listing or stat-ing the folder; O_EXCL makes each create
+    atomic, so even a suffix collision can't overwrite another upload.
+    Returns (file_path, binary file object).
+    """
+    base, ext = os.path.splitext(filename)
+    candidate = filename
+    while True:
+        file_path = os.path.join(UPLOAD_FOLDER, candidate)
+        try:
+            fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            candidate = f"{base}_{uuid.uuid4().hex[:8]}{ext}"
+            continue
+        return file_path, os.fdopen(fd, 'wb')
+
 @app.route('/health')
 def health_check():
     return jsonify({'status': 'healthy', 'message': 'AI Knowledge Base API is running'})
@@ -194,7 +400,6 @@ def get_csrf_token():
 @app.route('/auth/logout', methods=['POST'])
 def logout_override():
     """Logout endpoint - bypassing auth.py registration to add CSRF exemption"""
-    from flask import session
     session.pop('authenticated', None)
     session.pop('user_id', None)
     return jsonify({'success': True, 'message': 'Logged out'})
@@ -203,7 +408,6 @@ def logout_override():
 @app.route('/auth/login', methods=['POST'])
 def login_override():
     """Login endpoint - bypassing auth.py registration to add CSRF exemption"""
-    from flask import session
     if not auth.is_auth_enabled():
         return jsonify({'success': True, 'message': 'Authentication disabled'})
     
@@ -228,30 +432,26 @@ def init_database():
 @app.route('/projects', methods=['GET'])
 @auth.login_required
 def get_projects():
-    from models import Project, Conversation
     projects = Project.query.order_by(Project.created_at.desc()).all()
     
+    # Conversation counts for every project in one grouped query instead of
+    # a COUNT per project
+    conversation_counts = dict(db.session.execute(
+        select(Conversation.project_id, func.count(Conversation.id))
+        .where(Conversation.project_id.isnot(None))
+        .group_by(Conversation.project_id)
+    ).all())
+    
     project_data = []
     for project in projects:
-        # Count conversations for this project
-        conversation_count = db.session.query(Conversation).filter(
-            Conversation.project_id == project.id
-        ).count()
-        
-        project_data.append({
-            'id': str(project.id),
-            'name': project.name,
-            'description': project.description,
-            'created_at': project.created_at.isoformat(),
-            'updated_at': project.updated_at.isoformat() if project.updated_at else None,
-            'conversation_count': conversation_count
-        })
+        item = project.to_dict()
+        item['conversation_count'] = conversation_counts.get(project.id, 0)
+        project_data.append(item)
     
     return jsonify(project_data)
 
 @app.route('/projects', methods=['POST'])
 def create_project():
-    from models import Project
     data = request.get_json()
     if not data or not data.get('name'):
         return jsonify({'error': 'Project name is required'}), 400
@@ -261,20 +461,13 @@ def create_project():
     )
     db.session.add(project)
     db.session.commit()
-    return jsonify({
-        'id': str(project.id),
-        'name': project.name,
-        'description': project.description,
-        'created_at': project.created_at.isoformat(),
-        'updated_at': project.updated_at.isoformat() if project.updated_at else None
-    }), 201
+    return jsonify(project.to_dict()), 201
 
 @csrf.exempt
 @app.route('/projects/<project_id>', methods=['DELETE'])
 def delete_project(project_id):
     """Delete a project and set related conversations to no project"""
     try:
-        from models import Project, Conversation
         project = Project.query.get(project_id)
         if not project:
             return jsonify({'error': 'Project not found'}), 404
@@ -295,7 +488,6 @@ def delete_project(project_id):
 def rename_project(project_id):
     """Rename/update a project"""
     try:
-        from models import Project
         project = Project.query.get(project_id)
         if not project:
             return jsonify({'error': 'Project not found'}), 404
@@ -310,18 +502,17 @@ def rename_project(project_id):
         
         db.session.commit()
         
-        return jsonify({
-            'id': str(project.id),
-            'name': project.name,
-            'description': project.description,
-            'created_at': project.created_at.isoformat(),
-            'updated_at': project.updated_at.isoformat() if project.updated_at else None
-        }), 200
+        return jsonify(project.to_dict()), 200
     except Exception as e:
         app.logger.error(f"Error renaming project: {e}")
         db.session.rollback()
         return jsonify({'error': 'Failed to rename project'}), 500
 
+CONVERSATION_LIST_COLUMNS = (
+    Conversation.id, Conversation.project_id, Conversation.title, Conversation.llm_model,
+    Conversation.created_at, Conversation.updated_at, Conversation.tags, Conversation.message_count
+)
+
 @app.route('/conversations', methods=['GET'])
 def get_conversations():
     """Get conversations filtered by current user (authenticated or free user)"""
@@ -334,25 +525,60 @@ def get_conversations():
     if project_id:
         query = query.filter_by(project_id=project_id)
     
-    conversations = query.order_by(Conversation.updated_at.desc()).all()
-    
-    # Set session cookie for free users if needed
     identity = get_user_identity()
-    response_data = [
-        {
-            'id': str(conv.id),
-            'project_id': str(conv.project_id) if conv.project_id else None,
-            'title': conv.title,
-            'llm_model': conv.llm_model,
-            'created_at': conv.created_at.isoformat(),
-            'updated_at': conv.updated_at.isoformat(),
-            'tags': conv.tags or [],
-            'message_count': len(conv.messages)
-        }
-        for conv in conversations
-    ]
     
-    response = jsonify(response_data)
+    try:
+        limit, cursor = get_page_args()
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    # Any insert, delete or update of a listed conversation changes either its
+    # row count or max(updated_at), so repeat polls can be answered with a 304
+    # before loading and serializing the list
+    fingerprint = query.with_entities(
+        func.count(Conversation.id), func.max(Conversation.updated_at)
+    ).order_by(None).one()
+    etag, response = conditional_etag(
+        identity['type'], identity.get('user_id'), identity.get('session_id'),
+        project_id, limit, cursor, *fingerprint
+    )
+    
+    if response is None:
+        # Plain rows of just the listed columns: no ORM instances or identity
+        # map bookkeeping
+        query = query.with_entities(*CONVERSATION_LIST_COLUMNS)
+        if limit is None:
+            conversations = query.order_by(Conversation.updated_at.desc()).all()
+        else:
+            if cursor:
+                query = query.filter(keyset_filter(Conversation.updated_at, Conversation.id, cursor, descending=True))
+            conversations, next_cursor = split_page(
+                query.order_by(Conversation.updated_at.desc(), Conversation.id.desc()).limit(limit + 1).all(),
+                limit, 'updated_at'
+            )
+        # UUIDs and datetimes are left for the JSON provider to serialize
+        items = [
+            {
+                'id': conv.id,
+                'project_id': conv.project_id,
+                'title': conv.title,
+                'llm_model': conv.llm_model,
+                'created_at': conv.created_at,
+                'updated_at': conv.updated_at,
+                'tags': conv.tags or [],
+                'message_count': conv.message_count
+            }
+            for conv in conversations
+        ]
+        if limit is None:
+            response = jsonify(items)
+        else:
+            response = jsonify({
+                'items': items,
+                'next_cursor': next_cursor
+            })
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
     
     # Set session cookie for free users
     if identity['type'] == 'free' and identity['session_id'] and not request.cookies.get('session_id'):
@@ -372,7 +598,6 @@ def create_conversation():
     # Get user identity for ownership
     identity = get_user_identity()
     
-    from models import Conversation
     conversation = Conversation(
         title=data['title'],
         llm_model=data['llm_model'],
@@ -386,10 +611,10 @@ def create_conversation():
     db.session.commit()
     
     response_data = {
-        'id': str(conversation.id),
+        'id': conversation.id,
         'title': conversation.title,
         'llm_model': conversation.llm_model,
-        'created_at': conversation.created_at.isoformat(),
+        'created_at': conversation.created_at,
         'tags': conversation.tags
     }
     
@@ -401,40 +626,72 @@ def create_conversation():
     
     return response, 201
 
-@app.route('/conversations/<conversation_id>/messages', methods=['GET'])
+MESSAGE_COLUMNS = (Message.id, Message.role, Message.content, Message.timestamp)
+
+@app.route('/conversations/<uuid:conversation_id>/messages', methods=['GET'])
 @require_conversation_access
 def get_messages(conversation_id):
     try:
-        conv_uuid = uuid.UUID(conversation_id)
+        limit, cursor = get_page_args()
     except ValueError:
-        return jsonify({'error': 'Invalid conversation ID'}), 400
-    
-    conversation = Conversation.query.get_or_404(conv_uuid)
-    messages = Message.query.filter_by(conversation_id=conv_uuid).order_by(Message.timestamp.asc()).all()
-    
-    return jsonify({
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    # The listed conversation columns and the ETag fingerprint in one row.
+    # Messages are append-only and adding one bumps the conversation's
+    # updated_at, so (updated_at, message count) identifies this payload
+    conversation = db.session.execute(
+        select(
+            Conversation.id, Conversation.title, Conversation.llm_model, Conversation.project_id,
+            Conversation.updated_at, Conversation.message_count
+        ).where(Conversation.id == conversation_id)
+    ).first()
+    if conversation is None:
+        abort(404)
+    etag, not_modified = conditional_etag(
+        conversation_id, limit, cursor, conversation.updated_at, conversation.message_count
+    )
+    if not_modified is not None:
+        return not_modified
+    page = select(*MESSAGE_COLUMNS).where(Message.conversation_id == conversation_id)
+    if cursor:
+        page = page.where(keyset_filter(Message.timestamp, Message.id, cursor, descending=False))
+    page = page.order_by(Message.timestamp, Message.id)
+    if limit is not None:
+        page = page.limit(limit + 1)
+    messages = db.session.execute(page).all()
+    if limit is not None:
+        messages, next_cursor = split_page(messages, limit, 'timestamp')
+    
+    # Plain column rows; UUIDs and datetimes are left for the JSON provider
+    # to serialize
+    response_data = {
         'conversation': {
-            'id': str(conversation.id),
+            'id': conversation.id,
             'title': conversation.title,
             'llm_model': conversation.llm_model,
-            'project_id': str(conversation.project_id) if conversation.project_id else None
+            'project_id': conversation.project_id
         },
         'messages': [{
-            'id': str(msg.id),
+            'id': msg.id,
             'role': msg.role,
             'content': msg.content,
-            'timestamp': msg.timestamp.isoformat()
+            'timestamp': msg.timestamp
         } for msg in messages]
-    })
+    }
+    if limit is not None:
+        response_data['next_cursor'] = next_cursor
+    
+    response = jsonify(response_data)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
-@app.route('/conversations/<conversation_id>', methods=['DELETE'])
+@app.route('/conversations/<uuid:conversation_id>', methods=['DELETE'])
 @require_conversation_access
 def delete_conversation(conversation_id):
     """Delete a conversation and all its messages"""
     try:
-        conv_uuid = uuid.UUID(conversation_id)
-        
-        conversation = Conversation.query.get(conv_uuid)
+        conversation = Conversation.query.get(conversation_id)
         if not conversation:
             return jsonify({'error': 'Conversation not found'}), 404
         
@@ -444,23 +701,15 @@ def delete_conversation(conversation_id):
         
         return jsonify({'success': True, 'message': 'Conversation deleted'}), 200
         
-    except ValueError:
-        return jsonify({'error': 'Invalid conversation ID'}), 400
     except Exception as e:
         app.logger.error(f"Error deleting conversation: {e}")
         db.session.rollback()
         return jsonify({'error': 'Failed to delete conversation'}), 500
 
 @csrf.exempt
-@app.route('/conversations/<conversation_id>/messages', methods=['POST'])
+@app.route('/conversations/<uuid:conversation_id>/messages', methods=['POST'])
 @require_conversation_access
 def add_message(conversation_id):
-    try:
-        conv_uuid = uuid.UUID(conversation_id)
-    except ValueError:
-        return jsonify({'error': 'Invalid conversation ID'}), 400
-    
-    conversation = Conversation.query.get_or_404(conv_uuid)
     data = request.get_json()
     
     if not data or not data.get('role') or not data.get('content'):
@@ -469,22 +718,30 @@ def add_message(conversation_id):
     if data['role'] not in ['user', 'assistant']:
         return jsonify({'error': 'Role must be user or assistant'}), 400
     
-    message = Message(
-        conversation_id=conv_uuid,
-        role=data['role'],
-        content=data['content']
-    )
-    
-    conversation.updated_at = datetime.utcnow()
-    
-    db.session.add(message)
-    db.session.commit()
+    # Core INSERT ... RETURNING plus a bare UPDATE of the parent: no ORM
+    # instances, so nothing is expired on commit and re-SELECTed afterwards
+    try:
+        message_id, timestamp = db.session.execute(
+            insert(Message)
+            .values(conversation_id=conversation_id, role=data['role'], content=data['content'])
+            .returning(Message.id, Message.timestamp)
+        ).one()
+        db.session.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation_id)
+            .values(updated_at=utcnow(), message_count=Conversation.message_count + 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        abort(404)
     
     return jsonify({
-        'id': str(message.id),
-        'role': message.role,
-        'content': message.content,
-        'timestamp': message.timestamp.isoformat()
+        'id': message_id,
+        'role': data['role'],
+        'content': data['content'],
+        'timestamp': timestamp
     }), 201
 
 @csrf.exempt
@@ -504,80 +761,30 @@ def chat():
         
         # Handle free tier access
         if getattr(request, 'access_type', None) == 'free_tier':
-            from auth import FreeAccessManager
             free_info = FreeAccessManager.log_free_query(model)
-            app.logger.info(f"Free tier chat: model={model}, remaining={free_info['queries_remaining']}")
+            app.logger.info("Free tier chat: model=%s, remaining=%s", model, free_info['queries_remaining'])
         
-        app.logger.info(f"Chat request: model={model}, message_length={len(user_message)}")
+        app.logger.info("Chat request: model=%s, message_length=%d", model, len(user_message))
         
         # Get conversation history if conversation exists
         messages = []
         if conversation_id:
             conv_uuid = uuid.UUID(conversation_id)
-            conversation = Conversation.query.get_or_404(conv_uuid)
-            db_messages = Message.query.filter_by(conversation_id=conv_uuid).order_by(Message.timestamp.asc()).all()
-            messages = llm_service.format_conversation_for_llm(db_messages)
-            # Add context items to prompt using new context management system
-            try:
-                active_context = ContextService.get_conversation_context(str(conversation_id))
-                if active_context:
-                    # Build comprehensive context system message
-                    context_content = []
-                    for ctx in active_context:
-                        context_content.append(f"""
-=== {ctx['name']} ===
-Type: {ctx['content_type']}
-{f"Description: {ctx['description']}" if ctx['description'] else ""}
-
-{ctx['content_text']}
-""")
-                    
-                    if context_content:
-                        system_msg = f"""You have access to the following context documents for this conversation. Use this information to inform your responses:
-
-{chr(10).join(context_content)}
-
----
-Please use this context information appropriately when responding to user questions. If the user asks you to create content based on guidelines, use the provided guidelines. If they ask about document content, reference the documents above."""
-                        
-                        messages.insert(0, {
-                            'role': 'system',
-                            'content': system_msg
-                        })
-                        
-                        app.logger.info(f"Added {len(active_context)} context items to conversation {conversation_id}")
-                    
-            except Exception as context_error:
-                app.logger.error(f"Failed to load context for conversation {conversation_id}: {context_error}")
-            
-            # Fallback to old context_documents system for backward compatibility
-            import json
-            docs = getattr(conversation, 'context_documents', None)
-            if isinstance(docs, str):
-                try:
-                    docs = json.loads(docs)
-                except Exception:
-                    docs = []
-            if docs and not active_context:  # Only use old system if new system has no context
-                for doc in docs:
-                    if doc and 'content' in doc:
-                        task_type = doc.get('task_type', 'instructions')
-                        filename = doc.get('filename', 'uploaded file')
-                        content = doc['content']
-                        
-                        if task_type == 'summary':
-                            system_msg = f"You have been provided with a document ({filename}) to summarize. You can analyze, count words, and provide detailed summaries of this content:\n\n{content}"
-                        elif task_type == 'analysis':
-                            system_msg = f"You have been provided with a document ({filename}) to analyze. You can examine, count words, and provide detailed analysis of this content:\n\n{content}"
-                        else:
-                            system_msg = f"Document reference ({filename}): You have access to this document content and can answer questions about it, count words, analyze it, or use it as guidelines:\n\n{content}"
-                        
-                        messages.insert(0, {
-                            'role': 'system',
-                            'content': system_msg
-                        })
+            conversation = db.session.scalars(
+                select(Conversation).options(raiseload('*')).where(Conversation.id == conv_uuid)
+            ).first()
+            if conversation is None:
+                abort(404)
+            # Stable prefix first: one system block with the attached context
+            # (same bytes every turn), then history, then the new user message.
+            # Providers can then reuse their prompt cache for everything but
+            # the latest turn.
+            context_prompt = build_context_prompt(conversation, conversation_id)
+            messages = get_conversation_history(conversation)
+            if context_prompt:
+                messages = [{'role': 'system', 'content': context_prompt}] + messages
         # Log prompt details
-        app.logger.debug(f"LLM request with {len(messages)} messages for model {model}")
+        app.logger.debug("LLM request with %d messages for model %s", len(messages), model)
         
         # Add current user message
         messages.append({'role': 'user', 'content': user_message})
@@ -585,46 +792,43 @@ Please use this context information appropriately when responding to user questi
         # Check if user is authenticated (not free tier)
         is_authenticated = getattr(request, 'access_type', None) != 'free_tier'
         
-        app.logger.info(f"Calling LLM service for model: {model}, authenticated: {is_authenticated}")
+        app.logger.info("Calling LLM service for model: %s, authenticated: %s", model, is_authenticated)
+        
+        # Stream the response as Server-Sent Events when the client asks for it
+        if data.get('stream'):
+            return _stream_chat_response(model, messages, conversation_id, is_authenticated)
+        
+        # Or run it in the background and let the client poll /chat/jobs/<id>
+        if data.get('background'):
+            return _enqueue_chat_job(model, messages, conversation_id, is_authenticated)
+        
         # Get AI response and usage info
         ai_response, tokens, estimated_cost = llm_service.get_response(model, messages, is_authenticated=is_authenticated)
-        app.logger.info(f"Got response from {model}: {tokens} tokens, cost: ${estimated_cost:.4f}")
+        app.logger.info("Got response from %s: %s tokens, cost: $%.4f", model, tokens, estimated_cost)
         
         # Log usage
-        from models import LLMUsageLog
-        usage_log = LLMUsageLog(
-            model=model,
-            conversation_id=conversation_id if conversation_id else None,
-            tokens=tokens,
-            estimated_cost=estimated_cost
-        )
-        db.session.add(usage_log)
-        
         # Note: Context usage logging will be handled when messages are saved
         # to avoid foreign key constraints with non-existent message IDs
-        
-        db.session.commit()
+        log_usage_async(model, conversation_id, tokens, estimated_cost)
         
         # Prepare response
         response_data = {
             'response': ai_response,
             'model': model,
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': datetime.utcnow()
         }
         
         # Add updated free access info if applicable
         if getattr(request, 'access_type', None) == 'free_tier':
-            from auth import FreeAccessManager
             updated_free_info = FreeAccessManager.check_free_access()
             response_data['free_access'] = updated_free_info
         
         return jsonify(response_data)
         
     except Exception as e:
-        app.logger.error(f"Chat error: {str(e)}", exc_info=True)
+        app.logger.error("Chat error: %s", e, exc_info=True)
         # Log error to database
         try:
-            from models import LLMErrorLog
             error_log = LLMErrorLog(
                 model=model if 'model' in locals() else 'unknown',
                 conversation_id=conversation_id if 'conversation_id' in locals() and conversation_id else None,
@@ -633,54 +837,302 @@ Please use this context information appropriately when responding to user questi
             db.session.add(error_log)
             db.session.commit()
         except Exception as db_error:
-            app.logger.error(f"Failed to log error to database: {db_error}")
+            app.logger.error("Failed to log error to database: %s", db_error)
         return jsonify({'error': str(e)}), 500
 
+CONTEXT_PROMPT_HEADER = (
+    "You have access to the following context documents for this conversation. "
+    "Use this information to inform your responses:\n\n"
+)
+CONTEXT_PROMPT_FOOTER = (
+    "\n\n---\n"
+    "Please use this context information appropriately when responding to user questions. "
+    "If the user asks you to create content based on guidelines, use the provided guidelines. "
+    "If they ask about document content, reference the documents above."
+)
+
+def build_context_prompt(conversation, conversation_id):
+    """System prompt carrying the conversation's context documents, or None.
+    
+    Items keep their relevance order with ties broken by name and id, so the
+    text is byte-for-byte identical across turns and stays inside the
+    providers' cached prompt prefix.
+    """
+    # Add context items to prompt using new context management system
+    active_context = []
+    try:
+        active_context = ContextService.get_conversation_context(str(conversation_id))
+        if active_context:
+            # Build comprehensive context system message, writing each
+            # document's text straight into one buffer
+            ordered = sorted(active_context, key=lambda c: (-c['relevance_score'], c['name'] or '', c['item_id']))
+            buf = io.StringIO()
+            buf.write(CONTEXT_PROMPT_HEADER)
+            for i, ctx in enumerate(ordered):
+                if i:
+                    buf.write('\n')
+                buf.write(f"\n=== {ctx['name']} ===\nType: {ctx['content_type']}\n")
+                if ctx['description']:
+                    buf.write(f"Description: {ctx['description']}")
+                buf.write('\n\n')
+                buf.write(ctx['content_text'])
+                buf.write('\n')
+            buf.write(CONTEXT_PROMPT_FOOTER)
+            
+            app.logger.info("Added %d context items to conversation %s", len(active_context), conversation_id)
+            return buf.getvalue()
+            
+    except Exception as context_error:
+        app.logger.error("Failed to load context for conversation %s: %s", conversation_id, context_error)
+    
+    # Fallback to old context documents system for backward compatibility.
+    # Not gated on USE_LEGACY_CONTEXT (which only controls the extra copy on
+    # upload): conversations from before the context items system, and
+    # uploads whose context item couldn't be created, only exist here
+    if active_context:  # Only use old system if new system has no context
+        return None
+    docs = db.session.execute(
+        select(ContextDocument.filename, ContextDocument.content, ContextDocument.task_type)
+        .where(ContextDocument.conversation_id == conversation.id)
+        .order_by(ContextDocument.created_at, ContextDocument.id)
+    ).all()
+    
+    buf = io.StringIO()
+    for i, (filename, content, task_type) in enumerate(docs):
+        if i:
+            buf.write('\n\n')
+        if task_type == 'summary':
+            buf.write(f"You have been provided with a document ({filename}) to summarize. You can analyze, count words, and provide detailed summaries of this content:\n\n")
+        elif task_type == 'analysis':
+            buf.write(f"You have been provided with a document ({filename}) to analyze. You can examine, count words, and provide detailed analysis of this content:\n\n")
+        else:
+            buf.write(f"Document reference ({filename}): You have access to this document content and can answer questions about it, count words, analyze it, or use it as guidelines:\n\n")
+        buf.write(content)
+    
+    return buf.getvalue() or None
+
+def _stream_chat_response(model, messages, conversation_id, is_authenticated):
+    """Relay LLM output to the client as Server-Sent Events.
+    
+    Emits {'type': 'delta', 'content': ...} events while the model generates,
+    then a final {'type': 'done', ...} event carrying the same fields as the
+    blocking JSON reply. Usage is logged once the stream has finished.
+    """
+    def sse(payload):
+        return f"data: {app.json.dumps(payload)}\n\n"
+    
+    def generate():
+        try:
+            tokens, estimated_cost = 0, 0.0
+            for event in llm_service.stream_response(model, messages, is_authenticated=is_authenticated):
+                if event['type'] == 'done':
+                    tokens, estimated_cost = event['tokens'], event['cost']
+                else:
+                    yield sse(event)
+            app.logger.info("Streamed response from %s: %s tokens, cost: $%.4f", model, tokens, estimated_cost)
+            
+            log_usage_async(model, conversation_id, tokens, estimated_cost)
+            
+            done = {
+                'type': 'done',
+                'model': model,
+                'timestamp': datetime.utcnow()
+            }
+            if getattr(request, 'access_type', None) == 'free_tier':
+                done['free_access'] = FreeAccessManager.check_free_access()
+            yield sse(done)
+            
+        except Exception as e:
+            app.logger.error("Chat stream error: %s", e, exc_info=True)
+            db.session.rollback()
+            try:
+                db.session.add(LLMErrorLog(
+                    model=model,
+                    conversation_id=conversation_id if conversation_id else None,
+                    error_message=str(e)
+                ))
+                db.session.commit()
+            except Exception as db_error:
+                app.logger.error("Failed to log error to database: %s", db_error)
+            yield sse({'type': 'error', 'error': str(e)})
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Usage log rows are written after the chat reply has gone out, so the
+# INSERT and commit aren't part of the user-facing latency. Pending writes
+# are flushed when the executor is joined at interpreter exit.
+usage_log_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='usage-log')
+
+def _write_usage_log(values):
+    with app.app_context():
+        try:
+            db.session.execute(insert(LLMUsageLog).values(**values))
+            db.session.commit()
+        except Exception as e:
+            app.logger.error("Failed to log LLM usage: %s", e)
+            db.session.rollback()
+        finally:
+            db.session.remove()
+
+def log_usage_async(model, conversation_id, tokens, estimated_cost):
+    """Queue an LLMUsageLog row for the background writer"""
+    usage_log_executor.submit(_write_usage_log, {
+        'model': model,
+        'conversation_id': uuid.UUID(conversation_id) if conversation_id else None,
+        'tokens': tokens,
+        'estimated_cost': estimated_cost,
+        'timestamp': datetime.utcnow()
+    })
+
+# Background /chat jobs. Threads are enough since the work is waiting on the
+# LLM API; the job row in the database lets any worker process answer polls.
+chat_job_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('CHAT_JOB_WORKERS', '4')), thread_name_prefix='chat-job'
+)
+
+def _enqueue_chat_job(model, messages, conversation_id, is_authenticated):
+    """Record a pending ChatJob, run the LLM call in the background and reply 202"""
+    identity = get_user_identity()
+    job_id = uuid.uuid4()
+    conversation_id = uuid.UUID(conversation_id) if conversation_id else None
+    db.session.add(ChatJob(
+        id=job_id,
+        model=model,
+        conversation_id=conversation_id,
+        user_id=identity['user_id'],
+        session_id=identity['session_id']
+    ))
+    db.session.commit()
+    
+    chat_job_executor.submit(_run_chat_job, job_id, model, messages, conversation_id, is_authenticated)
+    app.logger.info("Queued chat job %s for model %s", job_id, model)
+    
+    return jsonify({
+        'job_id': job_id,
+        'status': 'pending',
+        'status_url': url_for('get_chat_job', job_id=job_id)
+    }), 202
+
+def _run_chat_job(job_id, model, messages, conversation_id, is_authenticated):
+    with app.app_context():
+        try:
+            db.session.execute(update(ChatJob).where(ChatJob.id == job_id).values(status='running'))
+            db.session.commit()
+            
+            ai_response, tokens, estimated_cost = llm_service.get_response(model, messages, is_authenticated=is_authenticated)
+            app.logger.info("Chat job %s finished: %s tokens, cost: $%.4f", job_id, tokens, estimated_cost)
+            
+            db.session.add(LLMUsageLog(
+                model=model,
+                conversation_id=conversation_id,
+                tokens=tokens,
+                estimated_cost=estimated_cost
+            ))
+            db.session.execute(update(ChatJob).where(ChatJob.id == job_id).values(
+                status='completed',
+                response=ai_response,
+                tokens=tokens,
+                estimated_cost=estimated_cost,
+                completed_at=utcnow()
+            ))
+            db.session.commit()
+            
+        except Exception as e:
+            app.logger.error("Chat job %s failed: %s", job_id, e, exc_info=True)
+            db.session.rollback()
+            # The job status is committed on its own so a failing error log
+            # can't leave the job polled as running forever
+            try:
+                db.session.execute(update(ChatJob).where(ChatJob.id == job_id).values(
+                    status='failed',
+                    error_message=str(e),
+                    completed_at=utcnow()
+                ))
+                db.session.commit()
+            except Exception as db_error:
+                db.session.rollback()
+                app.logger.error("Failed to record chat job failure: %s", db_error)
+            try:
+                db.session.add(LLMErrorLog(
+                    model=model,
+                    conversation_id=conversation_id,
+                    error_message=str(e)
+                ))
+                db.session.commit()
+            except Exception as db_error:
+                db.session.rollback()
+                app.logger.error("Failed to log chat job error: %s", db_error)
+        finally:
+            db.session.remove()
+
+@app.route('/chat/jobs/<uuid:job_id>', methods=['GET'])
+def get_chat_job(job_id):
+    """Poll a background chat job; 202 while it is still running"""
+    job = db.session.get(ChatJob, job_id)
+    identity = get_user_identity()
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    # A caller without an owner key must not match every job created
+    # without one (None == None)
+    if identity['type'] == 'authenticated':
+        owner_key, job_owner = identity['user_id'], job.user_id
+    else:
+        owner_key, job_owner = identity['session_id'], job.session_id
+    if owner_key is None or job_owner != owner_key:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    response_data = {'job_id': job.id, 'status': job.status, 'model': job.model}
+    if job.status == 'completed':
+        response_data['response'] = job.response
+        response_data['timestamp'] = job.completed_at
+    elif job.status == 'failed':
+        response_data['error'] = job.error_message
+    else:
+        return jsonify(response_data), 202
+    
+    if identity['type'] == 'free':
+        response_data['free_access'] = FreeAccessManager.check_free_access()
+    
+    return jsonify(response_data)
+
 @app.route('/transcribe', methods=['POST'])
+@max_request_size(SPEECH_MAX_UPLOAD)
 def transcribe_audio():
     try:
         if 'audio' not in request.files:
             return jsonify({'error': 'No audio file provided'}), 400
 
         audio_file = request.files['audio']
-        app.logger.info(f'Audio transcription request: {audio_file.filename}, Content-Type: {audio_file.content_type}')
+        app.logger.info('Audio transcription request: %s, Content-Type: %s', audio_file.filename, audio_file.content_type)
         if audio_file.filename == '':
             return jsonify({'error': 'No audio file selected'}), 400
 
-        # Supported formats for Google Speech-to-Text
-        SUPPORTED_FORMATS = ['flac', 'm4a', 'mp3', 'mp4', 'mpeg', 'mpga', 'oga', 'ogg', 'wav', 'webm']
         ext = audio_file.filename.rsplit('.', 1)[-1].lower()
-        if ext not in SUPPORTED_FORMATS:
+        if ext not in SPEECH_SUPPORTED_FORMATS:
             return jsonify({
-                'error': f'Unsupported file format: .{ext}. Supported formats: {SUPPORTED_FORMATS}'
+                'error': f'Unsupported file format: .{ext}. Supported formats: {sorted(SPEECH_SUPPORTED_FORMATS)}'
             }), 400
 
         from google.cloud import speech
-        import io
 
-        client = speech.SpeechClient()
-        audio_content = audio_file.read()
-        audio = speech.RecognitionAudio(content=audio_content)
+        client = get_speech_client()
 
-        # Use OGG_OPUS encoding for .ogg and .webm, LINEAR16 for others
-        if ext in ['ogg', 'webm']:
-            encoding = speech.RecognitionConfig.AudioEncoding.OGG_OPUS
-            sample_rate = 48000  # Opus is usually 48000 Hz
-        else:
-            encoding = speech.RecognitionConfig.AudioEncoding.LINEAR16
-            sample_rate = 16000  # Default for LINEAR16
-
-        config = speech.RecognitionConfig(
-            encoding=encoding,
-            sample_rate_hertz=sample_rate,
-            language_code="en-US",
+        # Feed the upload to Google in fixed-size chunks straight from the
+        # request stream rather than reading the whole file into memory
+        chunks = iter(lambda: audio_file.stream.read(SPEECH_CHUNK_SIZE), b'')
+        audio_requests = (speech.StreamingRecognizeRequest(audio_content=chunk) for chunk in chunks)
+        responses = client.streaming_recognize(
+            config=get_streaming_config(ext), requests=audio_requests, timeout=SPEECH_TIMEOUT
         )
 
-        response = client.recognize(config=config, audio=audio)
-
         transcription = ''
-        for result in response.results:
-            transcription += result.alternatives[0].transcript + ' '
+        for response in responses:
+            for result in response.results:
+                if result.is_final and result.alternatives:
+                    transcription += result.alternatives[0].transcript + ' '
 
         return jsonify({
             'transcription': transcription.strip(),
@@ -688,23 +1140,19 @@ def transcribe_audio():
         })
 
     except Exception as e:
-        app.logger.error(f"Transcription error: {str(e)}", exc_info=True)
+        app.logger.error("Transcription error: %s", e, exc_info=True)
         return jsonify({'error': str(e)}), 500
 
-@app.route('/conversations/<conversation_id>/attachments', methods=['POST'])
+@app.route('/conversations/<uuid:conversation_id>/attachments', methods=['POST'])
 @require_conversation_access
 def upload_attachments(conversation_id):
-    try:
-        conv_uuid = uuid.UUID(conversation_id)
-    except ValueError:
-        return jsonify({'error': 'Invalid conversation ID'}), 400
-    conversation = Conversation.query.get_or_404(conv_uuid)
+    conversation = Conversation.query.get_or_404(conversation_id)
     if 'files' not in request.files:
         return jsonify({'error': 'No files part in the request'}), 400
     files = request.files.getlist('files')
     if not files or files[0].filename == '':
         return jsonify({'error': 'No files selected'}), 400
-    attachments = []
+    saved_files = []
     try:
         for file in files:
             # Validate file
@@ -718,63 +1166,130 @@ def upload_attachments(conversation_id):
                 return jsonify({'error': f'File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB'}), 400
             
             filename = sanitize_filename(secure_filename(file.filename))
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            
-            # Ensure unique filename
-            base, ext = os.path.splitext(filename)
-            counter = 1
-            while os.path.exists(file_path):
-                filename = f"{base}_{counter}{ext}"
-                file_path = os.path.join(UPLOAD_FOLDER, filename)
-                counter += 1
             
-            file.save(file_path)
-            # Create a new message for the attachment (role='user', content='[file upload]')
-            message = Message(
-                conversation_id=conv_uuid,
-                role='user',
-                content=f'[File uploaded: {filename}]'
-            )
-            db.session.add(message)
-            db.session.flush()  # Get message.id
-            attachment = Attachment(
-                message_id=message.id,
-                filename=filename,
-                content_type=file.content_type,
-                file_path=os.path.relpath(file_path, os.getcwd()),
-                created_at=datetime.utcnow()  # Ensure created_at is set
-            )
-            db.session.add(attachment)
-            attachments.append({
-                'id': str(attachment.id),
+            # Ensure a unique name on disk; the user's name is what's displayed
+            file_path, dst = open_unique_upload(filename)
+            with dst:
+                file.save(dst, buffer_size=UPLOAD_COPY_BUFFER)
+            saved_files.append((filename, file.content_type, os.path.relpath(file_path, os.getcwd())))
+        
+        # One multi-row INSERT ... RETURNING for the messages (role='user',
+        # content='[file upload]') and one for their attachments, instead of
+        # an INSERT + flush round trip per file
+        message_ids = db.session.scalars(
+            insert(Message).returning(Message.id, sort_by_parameter_order=True),
+            [{
+                'conversation_id': conversation_id,
+                'role': 'user',
+                'content': f'[File uploaded: {filename}]'
+            } for filename, _, _ in saved_files]
+        ).all()
+        created = db.session.execute(
+            insert(Attachment).returning(Attachment.id, Attachment.created_at, sort_by_parameter_order=True),
+            [{
+                'message_id': message_id,
                 'filename': filename,
-                'content_type': file.content_type,
-                'file_path': attachment.file_path,
-                'created_at': attachment.created_at.isoformat() if hasattr(attachment, 'created_at') else datetime.utcnow().isoformat()
-            })
+                'content_type': content_type,
+                'file_path': rel_path
+            } for message_id, (filename, content_type, rel_path) in zip(message_ids, saved_files)]
+        ).all()
+        db.session.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation_id)
+            .values(updated_at=utcnow(), message_count=Conversation.message_count + len(saved_files))
+            .execution_options(synchronize_session=False)
+        )
         db.session.commit()
+        
+        attachments = [{
+            'id': attachment_id,
+            'filename': filename,
+            'content_type': content_type,
+            'file_path': rel_path,
+            'created_at': created_at
+        } for (attachment_id, created_at), (filename, content_type, rel_path) in zip(created, saved_files)]
         return jsonify({'attachments': attachments}), 201
     except Exception as e:
         app.logger.error(f"Attachment upload error: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+# Limit extracted content size to prevent memory issues
+MAX_CONTENT_SIZE = 5 * 1024 * 1024  # 5MB text limit
+# Characters of the raw extracted text kept alongside a context document
+ORIGINAL_CONTENT_PREVIEW = 1000
+# Sanitized text of recently extracted uploads keyed by (sha256 of the file,
+# extension), so re-uploading the same document skips the parse. Entries can
+# be up to MAX_CONTENT_SIZE, so keep this small.
+extracted_content_cache = LRUCache(maxsize=int(os.getenv('EXTRACTION_CACHE_SIZE', '16')))
+MAX_URL_CONTENT_SIZE = 10 * 1024 * 1024  # 10MB fetched page limit
+URL_FETCH_CHUNK = 64 * 1024
+# (connect, read) seconds: unreachable hosts fail fast, slow pages get longer
+URL_FETCH_TIMEOUT = (5, 15)
+URL_FETCH_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1'
+}
+def new_url_fetch_session():
+    session = requests.Session()
+    session.headers.update(URL_FETCH_HEADERS)
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+# Shared across requests so fetches from a host that was seen recently
+# reuse a kept-alive connection instead of a fresh DNS lookup and TLS
+# handshake. Its cookie jar accepts nothing, so cookies a site sets for one
+# user's fetch are never sent with another's (cookies set during a
+# redirect chain still apply within that request).
+url_fetch_session = new_url_fetch_session()
+# Transient gateway errors are retried (with a short backoff, ignoring
+# Retry-After so a worker isn't parked on a long sleep); connect and read
+# failures are not, so the handler's SSL / plain-HTTP fallbacks kick in
+# straight away
+_url_fetch_adapter = HTTPAdapter(
+    pool_connections=20, pool_maxsize=100,
+    max_retries=Retry(
+        total=2, connect=0, read=0, backoff_factor=0.2,
+        status_forcelist=(502, 503, 504), raise_on_status=False,
+        respect_retry_after_header=False
+    )
+)
+url_fetch_session.mount('https://', _url_fetch_adapter)
+url_fetch_session.mount('http://', _url_fetch_adapter)
+def header_charset(response):
+    """Charset given in the response's Content-Type header, or None.
+
+    Unlike response.encoding this doesn't fall back to ISO-8859-1 for text/*
+    types, which would override a <meta charset> in the page.
+    """
+    content_type = response.headers.get('content-type')
+    if not content_type:
+        return None
+    header = EmailMessage()
+    header['content-type'] = content_type
+    return header.get_content_charset()
+
+# Three or more line breaks (with any whitespace between them)
+EXCESS_BLANK_LINES_RE = re.compile(r'\n\s*\n\s*\n')
+
 def sanitize_content(content):
     """Sanitize extracted content to prevent security issues"""
     if not content:
         return content
     
-    # Limit content size to prevent memory issues
-    MAX_CONTENT_SIZE = 5 * 1024 * 1024  # 5MB text limit
     if len(content) > MAX_CONTENT_SIZE:
         content = content[:MAX_CONTENT_SIZE] + "\n\n[Content truncated for security...]"
     
-    # Remove potentially malicious patterns
+    # Neutralize markup. Escaping turns every '<' into '&lt;', so no
+    # <script>/<iframe> tags can survive it and no separate scan for them is
+    # needed
     content = html.escape(content)  # Escape HTML entities
-    content = re.sub(r'<script[^>]*>.*?</script>', '', content, flags=re.DOTALL | re.IGNORECASE)
-    content = re.sub(r'<iframe[^>]*>.*?</iframe>', '', content, flags=re.DOTALL | re.IGNORECASE)
     
     # Clean up excessive whitespace
-    content = re.sub(r'\n\s*\n\s*\n', '\n\n', content)
+    content = EXCESS_BLANK_LINES_RE.sub('\n\n', content)
     content = content.strip()
     
     return content
@@ -784,13 +1299,23 @@ def extract_document_content(file, filename):
     ext = filename.rsplit('.', 1)[-1].lower()
     content = ''
     
+    # Same bytes, same text: hashing is far cheaper than re-parsing
+    # (chunked rather than hashlib.file_digest, which needs Python 3.11)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.stream.read(UPLOAD_COPY_BUFFER), b''):
+        digest.update(chunk)
+    file.stream.seek(0)
+    cache_key = (digest.digest(), ext)
+    cached = extracted_content_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     try:
+        # PDF/DOCX parsing runs in the extraction worker processes
         if ext == 'pdf':
-            reader = PdfReader(file)
-            content = '\n'.join(page.extract_text() or '' for page in reader.pages)
+            content = run_extraction(extract_pdf_text, file.stream, MAX_CONTENT_SIZE)
         elif ext in ['docx', 'doc'] and DocxDocument:
-            doc = DocxDocument(file)
-            content = '\n'.join([p.text for p in doc.paragraphs])
+            content = run_extraction(extract_docx_text, file.stream, MAX_CONTENT_SIZE)
         elif ext in ['txt', 'md', 'csv']:
             content = file.read().decode('utf-8', errors='ignore')
         else:
@@ -798,18 +1323,18 @@ def extract_document_content(file, filename):
     except Exception as e:
         raise Exception(f'Failed to extract text from {filename}: {e}')
     
-    return sanitize_content(content)
+    content = sanitize_content(content)
+    extracted_content_cache.set(cache_key, content)
+    return content
 
 @app.route('/upload-context', methods=['POST'])
 @limiter.limit("10 per minute")
+@max_request_size(MAX_FILE_SIZE + UPLOAD_FORM_OVERHEAD)
 def upload_context():
     conversation_id = request.form.get('conversation_id')
     task_type = request.form.get('task_type', 'instructions')  # New: instructions, summary, analysis, etc.
     
-    # DEBUG LOGGING
-    app.logger.info(f"Upload context - Raw form data: {dict(request.form)}")
-    app.logger.info(f"Upload context - conversation_id received: '{conversation_id}' (type: {type(conversation_id)})")
-    app.logger.info(f"Upload context - bool check: {bool(conversation_id)}")
+    app.logger.debug("Upload context - form fields: %s, conversation_id: %r", list(request.form), conversation_id)
     
     if not conversation_id:
         app.logger.error("No conversation_id found in request.form")
@@ -846,6 +1371,7 @@ def upload_context():
         processed_content = process_document_by_task(content, filename, task_type)
         
         # Create context item using new context management system
+        context_item = None
         try:
             context_item = ContextService.create_context_item(
                 name=filename,
@@ -856,7 +1382,7 @@ def upload_context():
                 file_size=len(content) if content else 0,
                 extra_data={
                     'task_type': task_type,
-                    'original_content': content[:1000] if content else None  # Store first 1000 chars of original
+                    'original_content': content[:ORIGINAL_CONTENT_PREVIEW] if content else None  # Store the start of the original
                 }
             )
             
@@ -867,39 +1393,27 @@ def upload_context():
                 relevance_score=1.0
             )
             
-            app.logger.info(f"Created context item {context_item.id} for conversation {conversation_id}")
+            app.logger.info("Created context item %s for conversation %s", context_item.id, conversation_id)
             
         except Exception as context_error:
             app.logger.error(f"Failed to create context item: {context_error}")
-            # Continue with old system as fallback
-        
-        # Keep old system for backward compatibility
-        import json
-        docs = conversation.context_documents
+            db.session.rollback()
+            context_item = None
         
-        if not docs:
-            docs = []
-        elif isinstance(docs, str):
-            try:
-                docs = json.loads(docs)
-            except Exception:
-                docs = []
-        if not isinstance(docs, list):
-            docs = []
-        
-        docs.append({
-            'filename': filename, 
-            'content': processed_content,
-            'task_type': task_type,
-            'original_content': content  # Keep original for reference
-        })
-        
-        conversation.context_documents = docs
-        db.session.commit()
+        # Old system as fallback (or for every upload with USE_LEGACY_CONTEXT)
+        if context_item is None or app.config['USE_LEGACY_CONTEXT']:
+            db.session.add(ContextDocument(
+                conversation_id=conv_uuid,
+                filename=filename,
+                content=processed_content,
+                task_type=task_type,
+                original_content=content[:ORIGINAL_CONTENT_PREVIEW] if content else None
+            ))
+            db.session.commit()
         
         # Get file type for icon
         file_type = get_file_type(filename)
-        word_count = len(content.split()) if content else 0
+        word_count = count_words(content) if content else 0
         
         # Upload metadata logging removed for security
         
@@ -936,18 +1450,21 @@ def get_file_type(filename):
     
     return file_types.get(ext, 'file')
 
+# Prefix per task type; only the chosen one is formatted, so the (up to
+# MAX_CONTENT_SIZE) content is copied once
+TASK_PROMPT_PREFIXES = {
+    'instructions': "Use this document as guidelines and instructions for your responses:\n\n",
+    'summary': "Please summarize the following document ({filename}):\n\n",
+    'analysis': "Please analyze the following document ({filename}):\n\n",
+    'reference': "Reference document ({filename}) - use this information to answer questions:\n\n",
+    'template': "Use this document as a template or example ({filename}):\n\n"
+}
+DEFAULT_TASK_PROMPT_PREFIX = "Document ({filename}):\n\n"
+
 def process_document_by_task(content, filename, task_type):
     """Process document content based on intended task"""
-    
-    task_prompts = {
-        'instructions': f"Use this document as guidelines and instructions for your responses:\n\n{content}",
-        'summary': f"Please summarize the following document ({filename}):\n\n{content}",
-        'analysis': f"Please analyze the following document ({filename}):\n\n{content}",
-        'reference': f"Reference document ({filename}) - use this information to answer questions:\n\n{content}",
-        'template': f"Use this document as a template or example ({filename}):\n\n{content}"
-    }
-    
-    return task_prompts.get(task_type, f"Document ({filename}):\n\n{content}")
+    prefix = TASK_PROMPT_PREFIXES.get(task_type, DEFAULT_TASK_PROMPT_PREFIX)
+    return prefix.format(filename=filename) + content
 
 @app.route('/extract-url', methods=['POST'])
 @limiter.limit("5 per minute")
@@ -966,56 +1483,72 @@ def extract_url_content():
         conv_uuid = uuid.UUID(conversation_id)
         conversation = Conversation.query.get_or_404(conv_uuid)
         
-        # Extract content from URL using requests and basic HTML parsing
-        import requests
-        from bs4 import BeautifulSoup
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1'
-        }
-        
+        # Extract content from URL using requests and basic HTML parsing.
         # Try with different approaches if first fails
-        session = requests.Session()
-        session.headers.update(headers)
+        session = url_fetch_session
+        unverified_session = None
         
         try:
-            response = session.get(url, timeout=15, allow_redirects=True)
+            response = session.get(url, timeout=URL_FETCH_TIMEOUT, allow_redirects=True, stream=True)
             response.raise_for_status()
         except requests.exceptions.SSLError:
-            # Try without SSL verification as fallback
-            response = session.get(url, timeout=15, allow_redirects=True, verify=False)
-            response.raise_for_status()
+            # Try without SSL verification as fallback, on a throwaway session
+            # so the unverified connections never go back into the shared
+            # pool (CVE-2024-35195: requests < 2.32 reuses them for later
+            # verified requests to the same host)
+            unverified_session = new_url_fetch_session()
+            try:
+                response = unverified_session.get(url, timeout=URL_FETCH_TIMEOUT, allow_redirects=True, stream=True, verify=False)
+                response.raise_for_status()
+            except Exception:
+                unverified_session.close()
+                raise
         except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
             # Try with HTTP instead of HTTPS
             if url.startswith('https://'):
                 http_url = url.replace('https://', 'http://', 1)
-                response = session.get(http_url, timeout=15, allow_redirects=True)
+                response = session.get(http_url, timeout=URL_FETCH_TIMEOUT, allow_redirects=True, stream=True)
                 response.raise_for_status()
             else:
                 raise
         
-        # Check content size
-        content_length = response.headers.get('content-length')
-        if content_length and int(content_length) > 10 * 1024 * 1024:  # 10MB limit
-            return jsonify({'error': 'URL content too large (max 10MB)'}), 400
-        
-        # Parse HTML and extract text
-        soup = BeautifulSoup(response.content, 'html.parser')
+        # Stream the body into lxml's C parser (recovers from broken markup)
+        # as it arrives, enforcing the size limit on the bytes actually
+        # received since Content-Length may be missing or wrong
+        with response, unverified_session or nullcontext():
+            content_length = response.headers.get('content-length')
+            if content_length and int(content_length) > MAX_URL_CONTENT_SIZE:
+                return jsonify({'error': 'URL content too large (max 10MB)'}), 400
+            
+            # A charset in the Content-Type header overrides the page's own
+            # <meta> (as in browsers); without one libxml2 goes by the meta
+            # tag or BOM
+            try:
+                parser = lxml_html.HTMLParser(encoding=header_charset(response))
+            except LookupError:
+                parser = lxml_html.HTMLParser()
+            received = 0
+            try:
+                for chunk in response.iter_content(URL_FETCH_CHUNK):
+                    received += len(chunk)
+                    if received > MAX_URL_CONTENT_SIZE:
+                        return jsonify({'error': 'URL content too large (max 10MB)'}), 400
+                    parser.feed(chunk)
+                doc = parser.close()
+            except XMLSyntaxError:
+                # Empty document
+                return jsonify({'error': 'No readable content found at URL'}), 400
         
-        # Remove script and style elements
-        for script in soup(["script", "style", "nav", "footer", "header"]):
-            script.decompose()
+        # Extract title for display
+        title = (doc.findtext('.//title') or '').strip() or url
         
-        # Get text content
-        content = soup.get_text()
+        # Remove script and style elements (their tail text is kept)
+        for element in doc.xpath('//script|//style|//nav|//footer|//header'):
+            element.drop_tree()
         
-        # Clean up whitespace
-        lines = (line.strip() for line in content.splitlines())
+        # Clean up whitespace, reading lines off the text lazily rather than
+        # building a list of them
+        lines = (line.strip() for line in io.StringIO(doc.text_content(), newline=None))
         content = '\n'.join(line for line in lines if line)
         
         # Sanitize the extracted content
@@ -1028,34 +1561,17 @@ def extract_url_content():
         processed_content = process_document_by_task(content, url, task_type)
         
         # Add to conversation context
-        import json
-        docs = conversation.context_documents
-        if not docs:
-            docs = []
-        elif isinstance(docs, str):
-            try:
-                docs = json.loads(docs)
-            except Exception:
-                docs = []
-        if not isinstance(docs, list):
-            docs = []
-        
-        docs.append({
-            'filename': url,
-            'content': processed_content,
-            'task_type': task_type,
-            'original_content': content,
-            'source_type': 'url'
-        })
-        
-        conversation.context_documents = docs
+        db.session.add(ContextDocument(
+            conversation_id=conv_uuid,
+            filename=url,
+            content=processed_content,
+            task_type=task_type,
+            original_content=content[:ORIGINAL_CONTENT_PREVIEW],
+            source_type='url'
+        ))
         db.session.commit()
         
-        # Extract title for display
-        title_tag = soup.find('title')
-        title = title_tag.get_text().strip() if title_tag else url
-        
-        word_count = len(content.split()) if content else 0
+        word_count = count_words(content) if content else 0
         preview = content[:500] + ('...' if len(content) > 500 else '')
         
         return jsonify({
@@ -1147,6 +1663,7 @@ def generated_image(filename):
 @app.route('/stability-edit-image', methods=['POST'])
 @limiter.limit("10 per minute")
 @auth.access_required(allow_free=True)
+@max_request_size(MAX_FILE_SIZE + UPLOAD_FORM_OVERHEAD)
 def stability_edit_image():
     """Handle Stability AI image editing requests"""
     try:
@@ -1162,18 +1679,14 @@ def stability_edit_image():
         if not prompt:
             return jsonify({'error': 'Editing prompt is required'}), 400
         
-        app.logger.info(f"Stability image edit request: model={model}, prompt_length={len(prompt)}")
+        app.logger.info("Stability image edit request: model=%s, prompt_length=%d", model, len(prompt))
         
         # Use the LLM service to edit the image
-        from llm_service import LLMService
-        llm_service = LLMService()
-        
         # Process the image editing request
         response_message, tokens, cost = llm_service.edit_image(image_file, model, prompt)
         
         # Log usage for analytics
         try:
-            from models import LLMUsageLog
             usage_log = LLMUsageLog(
                 model=model,
                 tokens=tokens,
@@ -1188,7 +1701,7 @@ def stability_edit_image():
         return jsonify({
             'response': response_message,
             'model': model,
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': datetime.utcnow(),
             'editing_request': True,
             'tokens': tokens,
             'cost': cost
@@ -1198,58 +1711,56 @@ def stability_edit_image():
         app.logger.error(f"Stability image editing error: {str(e)}", exc_info=True)
         return jsonify({'error': f'Image editing failed: {str(e)}'}), 500
 
+# Dashboards poll the aggregate endpoints; serve each worker's serialized
+# result for STATS_CACHE_TTL seconds instead of re-running the GROUP BYs
+STATS_CACHE_TTL = int(os.getenv('STATS_CACHE_TTL', '30'))
+stats_response_cache = TTLCache(maxsize=64, ttl=STATS_CACHE_TTL)
+
+def cached_stats_response(key, build):
+    """JSON response for build(), reusing the serialized body while it is in stats_response_cache"""
+    body = stats_response_cache.get(key)
+    if body is None:
+        body = app.json.response(build()).get_data()
+        stats_response_cache.set(key, body)
+    response = app.response_class(body, mimetype=app.json.mimetype)
+    response.headers['Cache-Control'] = f'private, max-age={STATS_CACHE_TTL}'
+    return response
+
 @app.route('/llm-usage-stats', methods=['GET'])
 def llm_usage_stats():
-    from models import LLMUsageLog
-    from sqlalchemy import func, cast, Date
-    import datetime
-    # Aggregate by model (existing)
-    stats = db.session.query(
-        LLMUsageLog.model,
-        func.count().label('calls'),
-        func.coalesce(func.sum(LLMUsageLog.tokens), 0).label('total_tokens'),
-        func.coalesce(func.sum(LLMUsageLog.estimated_cost), 0.0).label('total_cost')
-    ).group_by(LLMUsageLog.model).all()
-    result = [
-        {
-            'model': row.model,
-            'calls': row.calls,
-            'total_tokens': row.total_tokens,
-            'total_cost': float(row.total_cost)
-        }
-        for row in stats
-    ]
+    # The 14-day window moves at midnight, so the date is part of the key
+    return cached_stats_response(('llm_usage_stats', date.today()), _llm_usage_stats)
+
+def _llm_usage_stats():
+    # Aggregate by model (existing); rows go to the JSON provider as mappings
+    stats = db.session.execute(
+        select(
+            LLMUsageLog.model,
+            func.count().label('calls'),
+            func.coalesce(func.sum(LLMUsageLog.tokens), 0).label('total_tokens'),
+            func.coalesce(func.sum(LLMUsageLog.estimated_cost), 0.0).label('total_cost')
+        ).group_by(LLMUsageLog.model)
+    ).mappings().all()
     # Aggregate by day and model for the last 14 days
-    today = datetime.date.today()
-    start_date = today - datetime.timedelta(days=13)
-    timeseries = db.session.query(
-        cast(LLMUsageLog.timestamp, Date).label('date'),
-        LLMUsageLog.model,
-        func.count().label('calls'),
-        func.coalesce(func.sum(LLMUsageLog.tokens), 0).label('tokens'),
-        func.coalesce(func.sum(LLMUsageLog.estimated_cost), 0.0).label('cost')
-    ).filter(LLMUsageLog.timestamp >= start_date).group_by('date', LLMUsageLog.model).order_by('date').all()
-    timeseries_result = [
-        {
-            'date': row.date.isoformat(),
-            'model': row.model,
-            'calls': row.calls,
-            'tokens': row.tokens,
-            'cost': float(row.cost)
-        }
-        for row in timeseries
-    ]
-    return jsonify({'stats': result, 'timeseries': timeseries_result})
+    today = date.today()
+    start_date = today - timedelta(days=13)
+    timeseries = db.session.execute(
+        select(
+            cast(LLMUsageLog.timestamp, Date).label('date'),
+            LLMUsageLog.model,
+            func.count().label('calls'),
+            func.coalesce(func.sum(LLMUsageLog.tokens), 0).label('tokens'),
+            func.coalesce(func.sum(LLMUsageLog.estimated_cost), 0.0).label('cost')
+        ).where(LLMUsageLog.timestamp >= start_date).group_by('date', LLMUsageLog.model).order_by('date')
+    ).mappings().all()
+    return {'stats': stats, 'timeseries': timeseries}
 
 @app.route('/monthly-token-usage', methods=['GET'])
 def monthly_token_usage():
-    from models import LLMUsageLog
-    from sqlalchemy import func, extract
-    import datetime
     
     # Get token usage by model for each month in the last 12 months
-    end_date = datetime.date.today()
-    start_date = end_date - datetime.timedelta(days=365)
+    end_date = date.today()
+    start_date = end_date - timedelta(days=365)
     
     monthly_stats = db.session.query(
         extract('year', LLMUsageLog.timestamp).label('year'),
@@ -1266,7 +1777,7 @@ def monthly_token_usage():
     
     result = []
     for row in monthly_stats:
-        month_name = datetime.date(int(row.year), int(row.month), 1).strftime('%Y-%m')
+        month_name = date(int(row.year), int(row.month), 1).strftime('%Y-%m')
         result.append({
             'month': month_name,
             'model': row.model,
@@ -1277,9 +1788,6 @@ def monthly_token_usage():
 
 @app.route('/session-token-usage', methods=['GET'])
 def session_token_usage():
-    from models import LLMUsageLog
-    from sqlalchemy import func
-    import datetime
     
     # Get current session ID from cookie or generate one
     user_identity = get_user_identity()
@@ -1287,8 +1795,8 @@ def session_token_usage():
     user_id = user_identity.get('user_id')
     
     # For current session, we'll look at today's usage for the current user
-    today = datetime.date.today()
-    today_start = datetime.datetime.combine(today, datetime.time.min)
+    today = date.today()
+    today_start = datetime.combine(today, datetime.min.time())
     
     query_filter = LLMUsageLog.timestamp >= today_start
     
@@ -1319,14 +1827,13 @@ def session_token_usage():
 
 @app.route('/llm-error-log', methods=['GET'])
 def llm_error_log():
-    from models import LLMErrorLog
     errors = LLMErrorLog.query.order_by(LLMErrorLog.timestamp.desc()).limit(20).all()
     result = [
         {
-            'timestamp': e.timestamp.isoformat(),
+            'timestamp': e.timestamp,
             'model': e.model,
             'error_message': e.error_message,
-            'conversation_id': str(e.conversation_id) if e.conversation_id else None
+            'conversation_id': e.conversation_id
         }
         for e in errors
     ]
@@ -1358,15 +1865,14 @@ def log_client_error():
 @auth.login_required
 def get_ip_whitelist():
     """Get all whitelisted IPs"""
-    from models import IPWhitelist
     whitelist = IPWhitelist.query.filter_by(is_active=True).order_by(IPWhitelist.created_at.desc()).all()
     
     return jsonify([
         {
-            'id': str(entry.id),
+            'id': entry.id,
             'ip_address': entry.ip_address,
             'description': entry.description,
-            'created_at': entry.created_at.isoformat(),
+            'created_at': entry.created_at,
             'created_by': entry.created_by
         }
         for entry in whitelist
@@ -1376,7 +1882,6 @@ def get_ip_whitelist():
 @auth.login_required
 def add_ip_to_whitelist():
     """Add IP to whitelist"""
-    from auth import FreeAccessManager
     
     data = request.get_json()
     if not data or not data.get('ip_address'):
@@ -1397,7 +1902,6 @@ def add_ip_to_whitelist():
 @auth.login_required  
 def remove_ip_from_whitelist(ip_address):
     """Remove IP from whitelist"""
-    from auth import FreeAccessManager
     
     success, message = FreeAccessManager.remove_from_whitelist(ip_address)
     
@@ -1410,10 +1914,9 @@ def remove_ip_from_whitelist(ip_address):
 @auth.login_required
 def get_usage_stats():
     """Get comprehensive usage statistics"""
-    from models import IPUsageSummary, FreeAccessLog, IPWhitelist
-    from sqlalchemy import func, desc
-    from datetime import datetime, timedelta
-    
+    return cached_stats_response(('usage_stats', datetime.utcnow().date()), _usage_stats)
+
+def _usage_stats():
     # Get top IPs by usage in last 7 days
     week_ago = datetime.utcnow() - timedelta(days=7)
     
@@ -1440,13 +1943,13 @@ def get_usage_stats():
         func.count(func.distinct(IPUsageSummary.ip_address)).label('unique_ips')
     ).filter(IPUsageSummary.date == today).first()
     
-    return jsonify({
+    return {
         'top_ips': [
             {
                 'ip_address': row.ip_address,
                 'total_queries': row.total_queries,
                 'unique_sessions': row.unique_sessions,
-                'last_activity': row.last_activity.isoformat() if row.last_activity else None
+                'last_activity': row.last_activity
             }
             for row in top_ips
         ],
@@ -1455,12 +1958,11 @@ def get_usage_stats():
             'total_queries': today_stats.total_queries or 0,
             'unique_ips': today_stats.unique_ips or 0
         }
-    })
+    }
 
 @app.route('/admin/current-ip', methods=['GET'])
 def get_current_ip():
     """Get current user's IP for easy whitelisting"""
-    from auth import FreeAccessManager
     
     ip = FreeAccessManager.get_client_ip()
     is_whitelisted, whitelist_entry = FreeAccessManager.is_whitelisted(ip)
@@ -1470,7 +1972,7 @@ def get_current_ip():
         'is_whitelisted': is_whitelisted,
         'whitelist_info': {
             'description': whitelist_entry.description if whitelist_entry else None,
-            'created_at': whitelist_entry.created_at.isoformat() if whitelist_entry else None
+            'created_at': whitelist_entry.created_at if whitelist_entry else None
         } if whitelist_entry else None
     })
 
@@ -1487,14 +1989,14 @@ def get_context_items():
             'success': True,
             'items': [
                 {
-                    'id': str(item.id),
+                    'id': item.id,
                     'name': item.name,
                     'description': item.description,
                     'content_type': item.content_type,
                     'token_count': item.token_count,
                     'usage_count': item.usage_count,
-                    'created_at': item.created_at.isoformat(),
-                    'last_used_at': item.last_used_at.isoformat() if item.last_used_at else None,
+                    'created_at': item.created_at,
+                    'last_used_at': item.last_used_at,
                     'is_active': item.is_active,
                     'file_size': item.file_size,
                     'original_filename': item.original_filename
@@ -1531,12 +2033,12 @@ def create_context_item():
         return jsonify({
             'success': True,
             'item': {
-                'id': str(context_item.id),
+                'id': context_item.id,
                 'name': context_item.name,
                 'description': context_item.description,
                 'content_type': context_item.content_type,
                 'token_count': context_item.token_count,
-                'created_at': context_item.created_at.isoformat()
+                'created_at': context_item.created_at
             }
         })
     
@@ -1555,7 +2057,7 @@ def get_context_item(item_id):
         return jsonify({
             'success': True,
             'item': {
-                'id': str(item.id),
+                'id': item.id,
                 'name': item.name,
                 'description': item.description,
                 'content_type': item.content_type,
@@ -1563,9 +2065,9 @@ def get_context_item(item_id):
                 'content_summary': item.content_summary,
                 'token_count': item.token_count,
                 'usage_count': item.usage_count,
-                'created_at': item.created_at.isoformat(),
-                'updated_at': item.updated_at.isoformat(),
-                'last_used_at': item.last_used_at.isoformat() if item.last_used_at else None,
+                'created_at': item.created_at,
+                'updated_at': item.updated_at,
+                'last_used_at': item.last_used_at,
                 'is_active': item.is_active,
                 'original_filename': item.original_filename,
                 'file_path': item.file_path,
@@ -1600,12 +2102,12 @@ def update_context_item(item_id):
         return jsonify({
             'success': True,
             'item': {
-                'id': str(updated_item.id),
+                'id': updated_item.id,
                 'name': updated_item.name,
                 'description': updated_item.description,
                 'content_type': updated_item.content_type,
                 'token_count': updated_item.token_count,
-                'updated_at': updated_item.updated_at.isoformat()
+                'updated_at': updated_item.updated_at
             }
         })
     
@@ -1686,11 +2188,11 @@ def add_context_to_conversation(conversation_id, context_item_id):
         return jsonify({
             'success': True,
             'session': {
-                'id': str(context_session.id),
-                'conversation_id': str(context_session.conversation_id),
-                'context_item_id': str(context_session.context_item_id),
+                'id': context_session.id,
+                'conversation_id': context_session.conversation_id,
+                'context_item_id': context_session.context_item_id,
                 'relevance_score': float(context_session.relevance_score),
-                'added_at': context_session.added_at.isoformat(),
+                'added_at': context_session.added_at,
                 'is_active': context_session.is_active
             }
         })
@@ -1735,6 +2237,35 @@ def get_context_stats():
 
 # ==================== SEARCH API ENDPOINTS ====================
 
+SEARCH_RESULT_COLUMNS = (
+    Conversation.id, Conversation.title, Conversation.project_id,
+    Conversation.created_at, Conversation.updated_at, Conversation.tags
+)
+# Rendered inline (not bound) so the expressions match the expression indexes
+SEARCH_TS_CONFIG = literal_column("'english'::regconfig")
+# Only the start of a message is indexed: Postgres rejects tsvectors over
+# 1MB, which an unbounded message could hit and so fail its INSERT. Must
+# match migration_search_fulltext_indexes.sql
+SEARCH_INDEXED_CHARS = literal_column('100000')
+SEARCH_FULLTEXT_MIN_LENGTH = 3
+# No <b> markers: the search panel does its own highlighting
+SEARCH_HEADLINE_OPTIONS = 'MaxWords=20, MinWords=10, StartSel="", StopSel=""'
+
+def substring_snippet(content, query_lower):
+    """Up to 50 characters either side of the first case-insensitive match, or None"""
+    start_idx = content.lower().find(query_lower)
+    if start_idx == -1:
+        return None
+    snippet_start = max(0, start_idx - 50)
+    snippet_end = min(len(content), start_idx + len(query_lower) + 50)
+    snippet = content[snippet_start:snippet_end]
+    
+    if snippet_start > 0:
+        snippet = "..." + snippet
+    if snippet_end < len(content):
+        snippet = snippet + "..."
+    return snippet
+
 @app.route('/api/search/conversations', methods=['GET'])
 def search_conversations():
     """Search conversations by content with project awareness"""
@@ -1746,21 +2277,31 @@ def search_conversations():
         if not query:
             return jsonify({'success': False, 'error': 'Query parameter is required'}), 400
         
-        from sqlalchemy import or_, and_, exists
-        from models import Conversation, Message
+        # Postgres full-text search (served by the GIN indexes from
+        # migration_search_fulltext_indexes.sql); substring ILIKE for short
+        # queries, where word matching would miss prefixes, and other databases
+        use_fulltext = len(query) >= SEARCH_FULLTEXT_MIN_LENGTH and db.engine.dialect.name == 'postgresql'
+        if use_fulltext:
+            ts_query = func.websearch_to_tsquery(SEARCH_TS_CONFIG, query)
+            title_match = func.to_tsvector(SEARCH_TS_CONFIG, Conversation.title).op('@@')(ts_query)
+            content_match = func.to_tsvector(SEARCH_TS_CONFIG, func.left(Message.content, SEARCH_INDEXED_CHARS)).op('@@')(ts_query)
+        else:
+            pattern = f'%{query}%'
+            title_match = Conversation.title.ilike(pattern)
+            content_match = Message.content.ilike(pattern)
         
         # Build search filter using EXISTS for better performance and no DISTINCT issues
         message_exists = exists().where(
             and_(
                 Message.conversation_id == Conversation.id,
-                Message.content.ilike(f'%{query}%')
+                content_match
             )
         )
         
         # For now, let's skip tag search in the backend to avoid SQL compatibility issues
         # The frontend already does client-side tag filtering for short queries
         search_filter = or_(
-            Conversation.title.ilike(f'%{query}%'),
+            title_match,
             message_exists
         )
         
@@ -1775,58 +2316,68 @@ def search_conversations():
                 return jsonify({'success': False, 'error': 'Invalid project_id'}), 400
         
         # Get conversations ordered by most recent (no DISTINCT needed with EXISTS)
-        conversations = base_query.order_by(Conversation.updated_at.desc()).limit(limit).all()
+        conversations = base_query.with_entities(*SEARCH_RESULT_COLUMNS).order_by(
+            Conversation.updated_at.desc()
+        ).limit(limit).all()
+        
+        # The newest matching messages of every listed conversation in one
+        # windowed query, instead of a query per conversation
+        matching_messages = {}
+        if conversations:
+            ranked = select(
+                Message.conversation_id, Message.role, Message.content, Message.timestamp,
+                func.row_number().over(
+                    partition_by=Message.conversation_id,
+                    order_by=(Message.timestamp.desc(), Message.id.desc())
+                ).label('rank')
+            ).where(
+                Message.conversation_id.in_([conv.id for conv in conversations]),
+                content_match
+            ).subquery()
+            content = ranked.c.content
+            if use_fulltext:
+                # Snippet cut by Postgres around the matched words, from the
+                # same indexed prefix; only run on the rows that survive the
+                # rank filter
+                content = func.ts_headline(
+                    SEARCH_TS_CONFIG, func.left(content, SEARCH_INDEXED_CHARS), ts_query, SEARCH_HEADLINE_OPTIONS
+                )
+            for msg in db.session.execute(
+                select(ranked.c.conversation_id, ranked.c.role, content.label('content'), ranked.c.timestamp)
+                .where(ranked.c.rank <= 3)
+                .order_by(ranked.c.rank)
+            ):
+                matching_messages.setdefault(msg.conversation_id, []).append(msg)
         
         # Format results with matching message snippets
+        query_lower = query.lower()
         results = []
         for conv in conversations:
-            # Find matching messages in this conversation
-            matching_messages = Message.query.filter(
-                and_(
-                    Message.conversation_id == conv.id,
-                    Message.content.ilike(f'%{query}%')
-                )
-            ).order_by(Message.timestamp.desc()).limit(3).all()
-            
             # Create snippets from matching messages
             snippets = []
-            for msg in matching_messages:
-                content = msg.content
-                # Find the query in content and create a snippet around it
-                query_lower = query.lower()
-                content_lower = content.lower()
-                
-                if query_lower in content_lower:
-                    start_idx = content_lower.find(query_lower)
-                    snippet_start = max(0, start_idx - 50)
-                    snippet_end = min(len(content), start_idx + len(query) + 50)
-                    snippet = content[snippet_start:snippet_end]
-                    
-                    if snippet_start > 0:
-                        snippet = "..." + snippet
-                    if snippet_end < len(content):
-                        snippet = snippet + "..."
-                    
+            for msg in matching_messages.get(conv.id, ()):
+                snippet = msg.content if use_fulltext else substring_snippet(msg.content, query_lower)
+                if snippet is not None:
                     snippets.append({
                         'content': snippet,
                         'role': msg.role,
-                        'timestamp': msg.timestamp.isoformat()
+                        'timestamp': msg.timestamp
                     })
             
             # If no message matches but title matches, use title
-            if not snippets and query.lower() in conv.title.lower():
+            if not snippets and (use_fulltext or query_lower in conv.title.lower()):
                 snippets.append({
                     'content': conv.title,
                     'role': 'title',
-                    'timestamp': conv.created_at.isoformat()
+                    'timestamp': conv.created_at
                 })
             
             results.append({
-                'id': str(conv.id),
+                'id': conv.id,
                 'title': conv.title,
-                'project_id': str(conv.project_id) if conv.project_id else None,
-                'created_at': conv.created_at.isoformat(),
-                'updated_at': conv.updated_at.isoformat(),
+                'project_id': conv.project_id,
+                'created_at': conv.created_at,
+                'updated_at': conv.updated_at,
                 'tags': conv.tags or [],
                 'snippets': snippets[:2]  # Limit to 2 snippets per conversation
             })
@@ -1978,7 +2529,6 @@ def get_model_settings():
     """Get current model settings"""
     try:
         # Check if user is authenticated
-        from auth import current_user_id
         user_id = current_user_id()
         if not user_id:
             return jsonify({'error': 'Authentication required'}), 401
@@ -1988,7 +2538,6 @@ def get_model_settings():
         settings_file = os.path.join(app.instance_path, 'model_settings.json')
         
         if os.path.exists(settings_file):
-            import json
             with open(settings_file, 'r') as f:
                 settings = json.load(f)
         else:
@@ -2028,7 +2577,6 @@ def save_model_settings():
     """Save model settings"""
     try:
         # Check if user is authenticated
-        from auth import current_user_id
         user_id = current_user_id()
         if not user_id:
             return jsonify({'error': 'Authentication required'}), 401
@@ -2042,11 +2590,10 @@ def save_model_settings():
         
         # Save settings to file (you can enhance this to use database)
         settings_file = os.path.join(app.instance_path, 'model_settings.json')
-        import json
         with open(settings_file, 'w') as f:
             json.dump(settings, f, indent=2)
         
-        app.logger.info(f"Model settings saved for user {user_id}")
+        app.logger.info("Model settings saved for user %s", user_id)
         return jsonify({'success': True, 'message': 'Settings saved successfully'})
     
     except Exception as e:
@@ -2058,7 +2605,6 @@ def check_model_access():
     """Check if a specific model is accessible"""
     try:
         # Check if user is authenticated
-        from auth import current_user_id
         user_id = current_user_id()
         if not user_id:
             return jsonify({'error': 'Authentication required'}), 401
@@ -2068,10 +2614,6 @@ def check_model_access():
         if not model:
             return jsonify({'error': 'Model not specified'}), 400
         
-        # Import LLM service to check model access
-        from llm_service import LLMService
-        llm_service = LLMService()
-        
         # Check if model is accessible by attempting to get info or make a test call
         has_access = False
         try:
@@ -2116,7 +2658,7 @@ def check_model_access():
             app.logger.error(f"Error checking model {model} access: {str(model_error)}")
             has_access = False
         
-        app.logger.info(f"Model {model} access check: {has_access}")
+        app.logger.debug("Model %s access check: %s", model, has_access)
         return jsonify({
             'success': True,
             'model': model,
@@ -2130,4 +2672,4 @@ def check_model_access():
 # ==================== END MODEL SETTINGS API ====================
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(debug=app.config.get('DEBUG', False), host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -75,7 +75,7 @@ class FreeAccessManager:
                 'queries_used': 0,
                 'queries_remaining': 999,
                 'limit': 999,
-                'reset_time': (datetime.utcnow() + timedelta(hours=24)).isoformat(),
+                'reset_time': datetime.utcnow() + timedelta(hours=24),
                 'reset_time_formatted': 'Unlimited (Whitelisted)',
                 'hours_until_reset': 24,
                 'whitelisted': True,
@@ -125,7 +125,7 @@ class FreeAccessManager:
             'queries_used': max_usage,
             'queries_remaining': remaining,
             'limit': cls.FREE_QUERY_LIMIT,
-            'reset_time': reset_time.isoformat(),
+            'reset_time': reset_time,
             'reset_time_formatted': reset_time.strftime('%Y-%m-%d %H:%M:%S UTC'),
             'hours_until_reset': max(0, (reset_time - datetime.utcnow()).total_seconds() / 3600),
             'whitelisted': False,
@@ -16,6 +16,7 @@ class Config:
         'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '3600')),  # 1 hour
         'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '20')),
         'pool_pre_ping': True,  # Validate connections before use
+        'pool_use_lifo': True,  # Reuse warm connections; lets idle extras time out
     }
     
     # Embedding configuration
@@ -26,6 +27,36 @@ class Config:
     DEFAULT_SEARCH_LIMIT = 10
     MAX_SEARCH_LIMIT = 50
     
+    # Response compression (Flask-Compress). Server-Sent Events are left out:
+    # compressing a stream buffers it and defeats incremental delivery
+    COMPRESS_MIMETYPES = ['application/json', 'text/html', 'text/css', 'application/javascript']
+    COMPRESS_ALGORITHM = ['br', 'gzip']
+    COMPRESS_LEVEL = 6  # gzip
+    COMPRESS_BR_LEVEL = 4
+    COMPRESS_MIN_SIZE = 512
+    COMPRESS_STREAMS = False
+    
+    # Rate limit counters (Flask-Limiter). memory:// is per process, so each
+    # Gunicorn worker counts separately; point RATELIMIT_STORAGE_URI at Redis
+    # (redis://host:6379/0) to share one counter across workers. The
+    # fixed-window strategy is one atomic INCR+EXPIRE per hit in Redis but
+    # lets up to twice the limit through across a window boundary;
+    # moving-window is exact (one Lua script over a sorted set, an entry per
+    # hit) and sliding-window-counter approximates it with two counters.
+    RATELIMIT_STORAGE_URI = os.getenv('RATELIMIT_STORAGE_URI', 'memory://')
+    RATELIMIT_STRATEGY = os.getenv('RATELIMIT_STRATEGY', 'fixed-window')
+    # Keep limiting per process if Redis becomes unreachable
+    RATELIMIT_IN_MEMORY_FALLBACK_ENABLED = True
+    
+    # Let a front-end server that supports X-Sendfile (Apache mod_xsendfile,
+    # lighttpd) stream /uploads files with sendfile(2) instead of the worker
+    USE_X_SENDFILE = os.getenv('USE_X_SENDFILE', 'False').lower() == 'true'
+    
+    # Also copy every /upload-context document into conversation_documents
+    # (the pre-ContextService store). Off: the copy is only written when
+    # creating the context item fails, so the text isn't stored twice.
+    USE_LEGACY_CONTEXT = os.getenv('USE_LEGACY_CONTEXT', 'False').lower() == 'true'
+    
     # Production optimizations
     SQLALCHEMY_RECORD_QUERIES = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
     
@@ -42,17 +73,21 @@ class DevelopmentConfig(Config):
         'pool_recycle': 3600,
         'max_overflow': 10,
         'pool_pre_ping': True,
+        'pool_use_lifo': True,
     }
 
 class ProductionConfig(Config):
     DEBUG = False
-    # Use larger connection pool for production
+    # Use larger connection pool for production. Each Gunicorn worker process
+    # has its own pool, so keep WEB_CONCURRENCY * (pool_size + max_overflow)
+    # below the database's max_connections
     SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_size': 20,
-        'pool_timeout': 30,
-        'pool_recycle': 1800,  # 30 minutes
-        'max_overflow': 50,
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '20')),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '30')),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),  # 30 minutes
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '40')),
         'pool_pre_ping': True,
+        'pool_use_lifo': True,
     }
     
     @staticmethod
@@ -70,13 +105,18 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URL', 'sqlite:///:memory:')
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_size': 2,
-        'pool_timeout': 10,
-        'pool_recycle': 3600,
-        'max_overflow': 5,
-        'pool_pre_ping': True,
-    }
+    # SQLite doesn't take QueuePool sizing options; leave pool selection to
+    # Flask-SQLAlchemy (StaticPool for in-memory databases)
+    if SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+    else:
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            'pool_size': 2,
+            'pool_timeout': 10,
+            'pool_recycle': 3600,
+            'max_overflow': 5,
+            'pool_pre_ping': True,
+        }
 
 config = {
     'development': DevelopmentConfig,
@@ -1,9 +1,10 @@
 from database import db
-from models import ContextItem, ContextSession, ContextUsageLog, ContextTemplate
+from models import ContextItem, ContextSession, ContextUsageLog, ContextTemplate, utcnow
 from datetime import datetime, date
 from typing import List, Optional, Dict, Any
 import uuid
 import hashlib
+from document_service import count_words
 
 
 class ContextService:
@@ -35,7 +36,7 @@ class ContextService:
         # Estimate token count (rough approximation)
         token_count = 0
         if content_text:
-            token_count = len(content_text.split()) * 1.3  # Rough token estimation
+            token_count = count_words(content_text) * 1.3  # Rough token estimation
         
         context_item = ContextItem(
             user_id=user_id,
@@ -102,11 +103,11 @@ class ContextService:
         if content_text is not None:
             context_item.content_text = content_text
             # Update token count
-            context_item.token_count = int(len(content_text.split()) * 1.3)
+            context_item.token_count = int(count_words(content_text) * 1.3)
         if extra_data is not None:
             context_item.extra_data = extra_data
             
-        context_item.updated_at = datetime.utcnow()
+        context_item.updated_at = utcnow()
         
         db.session.commit()
         return context_item
@@ -120,7 +121,7 @@ class ContextService:
             return False
         
         context_item.is_active = False
-        context_item.updated_at = datetime.utcnow()
+        context_item.updated_at = utcnow()
         
         db.session.commit()
         return True
@@ -196,8 +197,8 @@ class ContextService:
         result = []
         for session, item in context_sessions:
             result.append({
-                'session_id': str(session.id),
-                'item_id': str(item.id),
+                'session_id': session.id,
+                'item_id': item.id,
                 'name': item.name,
                 'description': item.description,
                 'content_type': item.content_type,
@@ -205,8 +206,8 @@ class ContextService:
                 'content_summary': item.content_summary,
                 'token_count': item.token_count,
                 'relevance_score': float(session.relevance_score),
-                'added_at': session.added_at.isoformat(),
-                'last_accessed_at': session.last_accessed_at.isoformat()
+                'added_at': session.added_at,
+                'last_accessed_at': session.last_accessed_at
             })
         
         return result
@@ -269,14 +270,14 @@ class ContextService:
             
             if score > 0:
                 suggestions.append({
-                    'item_id': str(item.id),
+                    'item_id': item.id,
                     'name': item.name,
                     'description': item.description,
                     'content_type': item.content_type,
                     'token_count': item.token_count,
                     'relevance_score': score,
                     'usage_count': item.usage_count,
-                    'last_used_at': item.last_used_at.isoformat() if item.last_used_at else None
+                    'last_used_at': item.last_used_at
                 })
         
         # Sort by relevance score and return top results
@@ -307,7 +308,7 @@ class ContextService:
             'total_items': total_items,
             'total_tokens': int(total_tokens),
             'most_used_item': {
-                'id': str(most_used.id),
+                'id': most_used.id,
                 'name': most_used.name,
                 'usage_count': most_used.usage_count
             } if most_used else None
@@ -0,0 +1,157 @@
+"""
+PDF/DOCX text extraction in short-lived worker processes.
+
+Parsing is CPU-bound, so running it on the request thread holds the GIL
+(and, under gevent, the whole worker) for the length of the parse. Each
+extraction gets its own process, so one that runs past the timeout can be
+killed without touching the others.
+
+Uploads are handed to the workers as a temp file path rather than pickled
+bytes; the parsers then read straight from the page cache (pdfium reads the
+file on demand, PyPDF2 gets an mmap, python-docx seeks in the zip).
+"""
+import io
+import os
+import re
+import mmap
+import time
+import shutil
+import tempfile
+import threading
+import multiprocessing
+from PyPDF2 import PdfReader
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+try:
+    from docx import Document as DocxDocument
+except ImportError:
+    DocxDocument = None
+
+EXTRACTION_WORKERS = int(os.getenv('EXTRACTION_WORKERS', '2'))
+EXTRACTION_TIMEOUT = float(os.getenv('EXTRACTION_TIMEOUT', '30'))
+COPY_BUFFER = 1024 * 1024
+WORD_RE = re.compile(r'\S+')
+# forkserver: children don't inherit the web worker's threads, locks or open
+# connections. The server imports this module (and the parsers) once, so
+# each extraction process is a cheap fork of it
+_mp_context = multiprocessing.get_context('forkserver')
+_mp_context.set_forkserver_preload([__name__])
+_slots = threading.BoundedSemaphore(EXTRACTION_WORKERS)
+
+
+def join_text_capped(parts, limit):
+    """Newline-join text parts, stopping once more than limit characters are collected.
+
+    parts is consumed lazily, so pages/paragraphs past the limit are never
+    extracted; the caller trims to the limit and marks the cut.
+    """
+    buf = io.StringIO()
+    for i, text in enumerate(parts):
+        if i:
+            buf.write('\n')
+        buf.write(text)
+        if buf.tell() > limit:
+            break
+    return buf.getvalue()
+
+
+def count_words(text):
+    """Number of whitespace-separated words in text, same as len(text.split()).
+
+    Walks regex matches instead of building the list, so a multi-MB document
+    doesn't allocate a string per word just to count them.
+    """
+    return sum(1 for _ in WORD_RE.finditer(text))
+
+
+def _pdfium_pages(doc):
+    for page in doc:
+        textpage = page.get_textpage()
+        try:
+            yield textpage.get_text_range()
+        finally:
+            textpage.close()
+            page.close()
+
+
+def extract_pdf_text(path, limit):
+    # pdfium (Chrome's C++ PDF engine) when available; PyPDF2 for files it
+    # can't open
+    if pdfium is not None:
+        try:
+            doc = pdfium.PdfDocument(path)
+        except pdfium.PdfiumError:
+            pass
+        else:
+            try:
+                return join_text_capped(_pdfium_pages(doc), limit)
+            finally:
+                doc.close()
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        reader = PdfReader(mm)
+        return join_text_capped((page.extract_text() or '' for page in reader.pages), limit)
+
+
+def extract_docx_text(path, limit):
+    doc = DocxDocument(path)
+    return join_text_capped((p.text for p in doc.paragraphs), limit)
+
+
+class ExtractionError(Exception):
+    """The extractor raised, or its process died, while parsing an upload"""
+
+
+def _extract_in_child(conn, extractor, path, limit):
+    try:
+        result = ('ok', extractor(path, limit))
+    except Exception as e:
+        # Send the message rather than the exception, which may not pickle
+        result = ('error', f'{type(e).__name__}: {e}')
+    conn.send(result)
+    conn.close()
+
+
+def _run_in_process(extractor, path, limit, timeout):
+    reader, writer = _mp_context.Pipe(duplex=False)
+    process = _mp_context.Process(target=_extract_in_child, args=(writer, extractor, path, limit), daemon=True)
+    process.start()
+    writer.close()
+    try:
+        # Receive before joining: a child blocked writing a large result to
+        # the pipe would never exit
+        if not reader.poll(timeout):
+            process.terminate()
+            raise TimeoutError(f'Extraction took longer than {EXTRACTION_TIMEOUT:g}s')
+        try:
+            status, value = reader.recv()
+        except EOFError:
+            process.join()
+            raise ExtractionError(f'Extraction process exited with code {process.exitcode}')
+    finally:
+        reader.close()
+        process.join()
+        process.close()
+    if status == 'error':
+        raise ExtractionError(value)
+    return value
+
+
+def run_extraction(extractor, stream, limit):
+    """Copy stream to a temp file, run extractor(path, limit) in its own process and return its text.
+
+    At most EXTRACTION_WORKERS extractions run at once per web worker.
+    Raises TimeoutError if waiting for a slot plus the parse take longer than
+    EXTRACTION_TIMEOUT seconds; only that extraction's process is killed.
+    """
+    deadline = time.monotonic() + EXTRACTION_TIMEOUT
+    with tempfile.NamedTemporaryFile(prefix='extract_') as tmp:
+        shutil.copyfileobj(stream, tmp, COPY_BUFFER)
+        tmp.flush()
+        if not _slots.acquire(timeout=max(0, deadline - time.monotonic())):
+            raise TimeoutError(f'No extraction slot free within {EXTRACTION_TIMEOUT:g}s')
+        try:
+            return _run_in_process(extractor, tmp.name, limit, max(0, deadline - time.monotonic()))
+        finally:
+            _slots.release()
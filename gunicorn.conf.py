@@ -0,0 +1,46 @@
+"""Gunicorn configuration for production deployments.
+
+/chat and /transcribe spend almost all of their time waiting on LLM and
+speech-to-text APIs. Threaded workers let a slow upstream call block a single
+thread instead of the whole worker process, so other requests keep flowing.
+
+Set GUNICORN_WORKER_CLASS=gevent to serve many more concurrent waiting
+requests per process with greenlets. Gunicorn monkey-patches the standard
+library in gevent workers; psycopg2 and gRPC (Google Speech) are C
+extensions and are made cooperative in post_fork below.
+
+That is this app's answer to async I/O: the Flask extensions it relies on
+(Flask-SQLAlchemy, Flask-Limiter, Flask-WTF, Flask-Compress) are WSGI-only,
+so handlers stay synchronous and gevent multiplexes the waiting instead of
+an ASGI port (Quart/FastAPI) with async handlers.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+# Handler threads spend nearly all their time blocked on upstream sockets
+# (GIL released), so a wide pool costs little CPU; keep DB_POOL_SIZE near it
+threads = int(os.getenv('GUNICORN_THREADS', '16'))
+# Concurrent greenlets per process (gevent worker class only)
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+
+# LLM completions for long prompts can legitimately take over a minute
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        # Without these every Postgres query / Speech call blocks the whole
+        # gevent worker
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+        
+        from grpc.experimental import gevent as grpc_gevent
+        grpc_gevent.init_gevent()
@@ -0,0 +1,41 @@
+from collections.abc import Mapping
+from decimal import Decimal
+
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson.
+
+    orjson serializes UUIDs and datetimes natively (ISO 8601, naive datetimes
+    stay naive, matching .isoformat()) and writes bytes directly, so responses
+    skip the str -> bytes encode step. SQLAlchemy result mappings serialize as
+    objects and Decimals as numbers, so aggregate rows can be returned without
+    rebuilding them; anything else orjson doesn't know (objects with __html__)
+    falls back to Flask's default handling.
+    """
+
+    sort_keys = False
+    option = orjson.OPT_NON_STR_KEYS
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, Mapping):
+            return dict(o)
+        if isinstance(o, Decimal):
+            return float(o)
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self.option),
+            mimetype=self.mimetype
+        )
@@ -2,15 +2,93 @@ from openai import OpenAI
 import anthropic
 import google.generativeai as genai
 import requests
+from requests.adapters import HTTPAdapter
 from config import Config
 import os
 import logging
 
+# Legacy Gemini model names -> current names
+GEMINI_MODEL_MAP = {
+    'gemini-pro': 'models/gemini-1.5-pro-002',
+    'gemini-flash': 'models/gemini-1.5-flash-latest',
+    'models/gemini-pro': 'models/gemini-1.5-pro-002',
+    'models/gemini-flash': 'models/gemini-1.5-flash-latest'
+}
+
+# Tried in order after the requested model when a Claude call fails
+CLAUDE_FALLBACK_MODELS = (
+    'claude-sonnet-4-20250514',
+    'claude-opus-4',
+    'claude-3-5-sonnet-20241022',
+    'claude-3-5-haiku-20241022',
+    'claude-3-opus-20240229',
+    'claude-3-sonnet-20240229',
+    'claude-3.5-sonnet-20240620',
+    'claude-3-haiku-20240307'
+)
+
+# Model names -> Hugging Face inference endpoints
+HUGGINGFACE_MODEL_MAP = {
+    'llama2-70b': 'meta-llama/Llama-2-70b-chat-hf',
+    'mixtral-8x7b': 'mistralai/Mixtral-8x7B-Instruct-v0.1',
+    'codellama-34b': 'codellama/CodeLlama-34b-Instruct-hf'
+}
+
+STABILITY_MODELS = frozenset(['stable-image-ultra', 'stable-image-core', 'stable-image-sd3', 'stable-audio-2'])
+
+# Practical token limits per model
+MODEL_LIMITS = {
+    # OpenAI Models - Updated to current limits (2024)
+    'gpt-4': {'max_tokens': 4000, 'context_window': 8000},
+    'gpt-4-turbo': {'max_tokens': 4000, 'context_window': 128000},
+    'gpt-4o': {'max_tokens': 4000, 'context_window': 128000},
+    'gpt-4o-mini': {'max_tokens': 4000, 'context_window': 128000},
+    'gpt-3.5-turbo': {'max_tokens': 4000, 'context_window': 16000},
+    'o1-preview': {'max_tokens': 32768, 'context_window': 128000},
+    'o1-mini': {'max_tokens': 65536, 'context_window': 128000},
+    
+    # Anthropic Claude Models - High capacity
+    'claude-3-opus': {'max_tokens': 4000, 'context_window': 180000},
+    'claude-3-sonnet': {'max_tokens': 4000, 'context_window': 180000}, 
+    'claude-3-haiku': {'max_tokens': 4000, 'context_window': 180000},
+    'claude-3.5-sonnet': {'max_tokens': 8000, 'context_window': 180000},
+    'claude-sonnet-4-20250514': {'max_tokens': 8000, 'context_window': 180000},
+    'claude-3-5-sonnet-20241022': {'max_tokens': 8000, 'context_window': 180000},
+    
+    # Google Gemini Models - Highest capacity
+    'gemini-pro': {'max_tokens': 8000, 'context_window': 900000},
+    'gemini-flash': {'max_tokens': 8000, 'context_window': 900000},
+    'gemini-1.5-pro': {'max_tokens': 8000, 'context_window': 2000000},
+    'gemini-1.5-flash': {'max_tokens': 8000, 'context_window': 1000000},
+    
+    # Hugging Face Models - Limited
+    'llama2-70b': {'max_tokens': 2000, 'context_window': 3000},
+    'mixtral-8x7b': {'max_tokens': 3000, 'context_window': 30000}, 
+    'codellama-34b': {'max_tokens': 3000, 'context_window': 14000},
+    
+    # Stability AI Models (Image & Audio Generation)
+    'stable-image-ultra': {'max_tokens': 500, 'context_window': 1000},
+    'stable-image-core': {'max_tokens': 500, 'context_window': 1000},
+    'stable-image-sd3': {'max_tokens': 500, 'context_window': 1000},
+    'stable-audio-2': {'max_tokens': 300, 'context_window': 600}
+}
+DEFAULT_MODEL_LIMITS = {'max_tokens': 2000, 'context_window': 6000}
+
+# Color words recognised in recolor prompts, in match order
+RECOLOR_COLORS = ("red", "blue", "green", "yellow", "orange", "purple", "pink", "brown", "black", "white", "gray", "grey")
+
 class LLMService:
     def __init__(self):
         # Initialize logger
         self.logger = logging.getLogger('llm_service')
         
+        # One pooled HTTP session for the provider REST calls (Anthropic,
+        # Hugging Face, Stability) so connections are kept alive and reused
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=20, pool_maxsize=100)
+        self.http.mount('https://', adapter)
+        self.http.mount('http://', adapter)
+        
         # Initialize all availability flags
         self.openai_available = False
         self.anthropic_available = False
@@ -66,23 +144,16 @@ class LLMService:
     def get_response(self, model, messages, max_tokens=4000, temperature=0.7, is_authenticated=False):
         """Get response from specified LLM model. Returns (response_text, tokens, estimated_cost)"""
         # Map legacy Gemini model names to current names
-        GEMINI_MODEL_MAP = {
-            'gemini-pro': 'models/gemini-1.5-pro-002',
-            'gemini-flash': 'models/gemini-1.5-flash-latest',
-            'models/gemini-pro': 'models/gemini-1.5-pro-002',
-            'models/gemini-flash': 'models/gemini-1.5-flash-latest'
-        }
-        if model in GEMINI_MODEL_MAP:
-            model = GEMINI_MODEL_MAP[model]
+        model = GEMINI_MODEL_MAP.get(model, model)
         if model.startswith('gpt') or model.startswith('o1'):
             return self._get_openai_response(model, messages, max_tokens, temperature, is_authenticated)
         elif model.startswith('claude'):
             return self._get_anthropic_response(model, messages, max_tokens, temperature)
         elif model.startswith('models/gemini'):
             return self._get_gemini_response(model, messages, max_tokens, temperature)
-        elif model in ['llama2-70b', 'mixtral-8x7b', 'codellama-34b']:
+        elif model in HUGGINGFACE_MODEL_MAP:
             return self._get_huggingface_response(model, messages, max_tokens, temperature)
-        elif model in ['stable-image-ultra', 'stable-image-core', 'stable-image-sd3', 'stable-audio-2']:
+        elif model in STABILITY_MODELS:
             return self._get_stability_response(model, messages, max_tokens, temperature)
         else:
             raise ValueError(f"Model {model} not available")
@@ -93,19 +164,7 @@ class LLMService:
             raise Exception("OpenAI API key not configured")
             
         try:
-            # Calculate rough token count to prevent silent failures
-            total_chars = sum(len(str(msg.get('content', ''))) for msg in messages)
-            estimated_tokens = total_chars // 3  # Rough estimate: 3 chars per token
-            
-            self.logger.info(f"OpenAI request: model={model}, estimated_tokens={estimated_tokens}, max_tokens={max_tokens}, authenticated={is_authenticated}")
-            
-            # Check if we're likely to exceed limits (only for free users)
-            if not is_authenticated:
-                model_limits = self.get_model_limits(model)
-                if estimated_tokens + max_tokens > model_limits['context_window']:
-                    raise Exception(f"Request too large for {model}. Estimated {estimated_tokens} tokens, max allowed {model_limits['context_window']}. Try using Gemini Pro or Claude for large documents.")
-            else:
-                self.logger.info("Skipping token limits for authenticated user")
+            self._check_openai_request_size(model, messages, max_tokens, is_authenticated)
             
             # O1 models have different API requirements
             if model.startswith('o1'):
@@ -125,55 +184,120 @@ class LLMService:
             
             text = response.choices[0].message.content
             tokens = response.usage.total_tokens if response.usage else 0
-            
-            # Updated pricing (as of 2024):
-            # gpt-4: $0.03/1K prompt, $0.06/1K completion; gpt-3.5: $0.001/1K; o1: $15/1M
-            if model.startswith('o1-preview'):
-                cost = tokens * 0.000015  # $15/1M tokens
-            elif model.startswith('o1-mini'):
-                cost = tokens * 0.000003  # $3/1M tokens  
-            elif model.startswith('gpt-4'):
-                cost = tokens * 0.00006  # $0.06/1K tokens (rough estimate)
-            elif model.startswith('gpt-3.5'):
-                cost = tokens * 0.000002  # $0.002/1K tokens
-            else:
-                cost = tokens * 0.00002  # fallback
-            return text, tokens, cost
+            return text, tokens, self._openai_cost(model, tokens)
             
         except Exception as e:
             self.logger.error(f"OpenAI API error: {type(e).__name__}: {str(e)}")
             raise Exception(f"OpenAI API error: {str(e)}")
     
+    def _check_openai_request_size(self, model, messages, max_tokens, is_authenticated):
+        """Reject requests that are likely to exceed the model's context window (free users only)"""
+        # Calculate rough token count to prevent silent failures
+        total_chars = sum(len(str(msg.get('content', ''))) for msg in messages)
+        estimated_tokens = total_chars // 3  # Rough estimate: 3 chars per token
+        
+        self.logger.info(f"OpenAI request: model={model}, estimated_tokens={estimated_tokens}, max_tokens={max_tokens}, authenticated={is_authenticated}")
+        
+        # Check if we're likely to exceed limits (only for free users)
+        if not is_authenticated:
+            model_limits = self.get_model_limits(model)
+            if estimated_tokens + max_tokens > model_limits['context_window']:
+                raise Exception(f"Request too large for {model}. Estimated {estimated_tokens} tokens, max allowed {model_limits['context_window']}. Try using Gemini Pro or Claude for large documents.")
+        else:
+            self.logger.info("Skipping token limits for authenticated user")
+    
+    def _openai_cost(self, model, tokens):
+        """Estimate the cost of an OpenAI call from its total token count"""
+        # Updated pricing (as of 2024):
+        # gpt-4: $0.03/1K prompt, $0.06/1K completion; gpt-3.5: $0.001/1K; o1: $15/1M
+        if model.startswith('o1-preview'):
+            return tokens * 0.000015  # $15/1M tokens
+        elif model.startswith('o1-mini'):
+            return tokens * 0.000003  # $3/1M tokens  
+        elif model.startswith('gpt-4'):
+            return tokens * 0.00006  # $0.06/1K tokens (rough estimate)
+        elif model.startswith('gpt-3.5'):
+            return tokens * 0.000002  # $0.002/1K tokens
+        else:
+            return tokens * 0.00002  # fallback
+    
+    def stream_response(self, model, messages, max_tokens=4000, temperature=0.7, is_authenticated=False):
+        """Stream a response as it is generated.
+        
+        Yields {'type': 'delta', 'content': str} chunks followed by a single
+        {'type': 'done', 'tokens': int, 'cost': float}. Providers without a
+        streaming integration yield their whole response as one delta.
+        """
+        if model.startswith('gpt'):
+            yield from self._stream_openai_response(model, messages, max_tokens, temperature, is_authenticated)
+            return
+        
+        text, tokens, cost = self.get_response(model, messages, max_tokens, temperature, is_authenticated)
+        yield {'type': 'delta', 'content': text}
+        yield {'type': 'done', 'tokens': tokens, 'cost': cost}
+    
+    def _stream_openai_response(self, model, messages, max_tokens, temperature, is_authenticated=False):
+        """Stream tokens from OpenAI chat models"""
+        if not self.openai_available or not self.openai_client:
+            raise Exception("OpenAI API key not configured")
+        
+        self._check_openai_request_size(model, messages, max_tokens, is_authenticated)
+        
+        try:
+            stream = self.openai_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+                stream_options={'include_usage': True}
+            )
+            
+            tokens = 0
+            for chunk in stream:
+                if chunk.usage:
+                    tokens = chunk.usage.total_tokens
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield {'type': 'delta', 'content': chunk.choices[0].delta.content}
+            
+            yield {'type': 'done', 'tokens': tokens, 'cost': self._openai_cost(model, tokens)}
+            
+        except Exception as e:
+            self.logger.error(f"OpenAI streaming error: {type(e).__name__}: {str(e)}")
+            raise Exception(f"OpenAI API error: {str(e)}")
+    
     def _get_anthropic_response(self, model, messages, max_tokens, temperature):
         """Get response from Anthropic Claude models using direct HTTP requests."""
         if not self.anthropic_available or not self.claude_key:
             raise Exception("Anthropic API key not configured")
-        claude_models = [
-            'claude-sonnet-4-20250514',
-            'claude-opus-4',
-            'claude-3-5-sonnet-20241022',
-            'claude-3-5-haiku-20241022',
-            'claude-3-opus-20240229',
-            'claude-3-sonnet-20240229',
-            'claude-3.5-sonnet-20240620',
-            'claude-3-haiku-20240307'
-        ]
-        try_models = [model] + [m for m in claude_models if m != model]
-        # Convert messages format for Anthropic
+        try_models = [model] + [m for m in CLAUDE_FALLBACK_MODELS if m != model]
+        # Convert messages format for Anthropic (a single top-level system prompt)
         anthropic_messages = []
-        system_message = None
+        system_parts = []
         for msg in messages:
             if msg['role'] == 'system':
-                system_message = msg['content']
+                system_parts.append(msg['content'])
             else:
                 anthropic_messages.append({
                     'role': msg['role'],
                     'content': msg['content']
                 })
+        system_message = '\n\n'.join(system_parts) or "You are a helpful AI assistant."
+        # Prompt caching: breakpoints after the system prompt and after the
+        # latest message, so the next turn re-reads everything before its new
+        # message from cache. Prompts below the minimum cacheable length are
+        # simply processed uncached.
+        system_blocks = [{'type': 'text', 'text': system_message, 'cache_control': {'type': 'ephemeral'}}]
+        if anthropic_messages:
+            anthropic_messages[-1]['content'] = [{
+                'type': 'text',
+                'text': anthropic_messages[-1]['content'],
+                'cache_control': {'type': 'ephemeral'}
+            }]
         last_error = None
         for try_model in try_models:
             try:
-                resp = requests.post(
+                resp = self.http.post(
                     "https://api.anthropic.com/v1/messages",
                     headers={
                         "x-api-key": self.claude_key,
@@ -184,7 +308,7 @@ class LLMService:
                         "model": try_model,
                         "max_tokens": max_tokens,
                         "temperature": temperature,
-                        "system": system_message or "You are a helpful AI assistant.",
+                        "system": system_blocks,
                         "messages": anthropic_messages
                     },
                     timeout=15
@@ -237,14 +361,7 @@ class LLMService:
             raise Exception("Hugging Face API key not configured")
             
         try:
-            # Map model names to HF endpoints
-            model_mapping = {
-                'llama2-70b': 'meta-llama/Llama-2-70b-chat-hf',
-                'mixtral-8x7b': 'mistralai/Mixtral-8x7B-Instruct-v0.1',
-                'codellama-34b': 'codellama/CodeLlama-34b-Instruct-hf'
-            }
-            
-            hf_model = model_mapping.get(model, model)
+            hf_model = HUGGINGFACE_MODEL_MAP.get(model, model)
             
             # Format conversation for HF
             conversation_text = ""
@@ -252,7 +369,7 @@ class LLMService:
                 role = msg['role'].capitalize()
                 conversation_text += f"{role}: {msg['content']}\n\n"
             
-            response = requests.post(
+            response = self.http.post(
                 f"https://api-inference.huggingface.co/models/{hf_model}",
                 headers=self.hf_headers,
                 json={
@@ -340,7 +457,7 @@ class LLMService:
                 files['aspect_ratio'] = (None, '1:1')
                 files['seed'] = (None, '0')
             
-            response = requests.post(
+            response = self.http.post(
                 endpoint,
                 headers={
                     "Authorization": f"Bearer {self.stability_api_key}",
@@ -427,7 +544,7 @@ class LLMService:
     def _generate_audio(self, endpoint, prompt):
         """Generate audio using Stability AI v2beta endpoints"""
         try:
-            response = requests.post(
+            response = self.http.post(
                 endpoint,
                 headers={
                     "Authorization": f"Bearer {self.stability_api_key}",
@@ -547,7 +664,7 @@ class LLMService:
                 'image': (image_file.filename, image_file.read(), image_file.content_type)
             }
             
-            response = requests.post(
+            response = self.http.post(
                 endpoint,
                 headers={
                     "Authorization": f"Bearer {self.stability_api_key}",
@@ -592,7 +709,7 @@ class LLMService:
                 'output_format': (None, 'png')
             }
             
-            response = requests.post(
+            response = self.http.post(
                 endpoint,
                 headers={
                     "Authorization": f"Bearer {self.stability_api_key}",
@@ -639,7 +756,7 @@ class LLMService:
                 'output_format': (None, 'png')
             }
             
-            response = requests.post(
+            response = self.http.post(
                 endpoint,
                 headers={
                     "Authorization": f"Bearer {self.stability_api_key}",
@@ -690,7 +807,7 @@ class LLMService:
                 'output_format': (None, 'png')
             }
             
-            response = requests.post(
+            response = self.http.post(
                 endpoint,
                 headers={
                     "Authorization": f"Bearer {self.stability_api_key}",
@@ -741,7 +858,7 @@ class LLMService:
                 'output_format': (None, 'png')
             }
             
-            response = requests.post(
+            response = self.http.post(
                 endpoint,
                 headers={
                     "Authorization": f"Bearer {self.stability_api_key}",
@@ -792,7 +909,7 @@ class LLMService:
                 'output_format': (None, 'png')
             }
             
-            response = requests.post(
+            response = self.http.post(
                 endpoint,
                 headers={
                     "Authorization": f"Bearer {self.stability_api_key}",
@@ -839,7 +956,7 @@ class LLMService:
                 'output_format': (None, 'png')
             }
             
-            response = requests.post(
+            response = self.http.post(
                 endpoint,
                 headers={
                     "Authorization": f"Bearer {self.stability_api_key}",
@@ -957,10 +1074,9 @@ class LLMService:
         prompt_lower = prompt.lower()
         
         # Extract color words
-        colors = ["red", "blue", "green", "yellow", "orange", "purple", "pink", "brown", "black", "white", "gray", "grey"]
         found_color = "blue"  # default
         
-        for color in colors:
+        for color in RECOLOR_COLORS:
             if color in prompt_lower:
                 found_color = color
                 break
@@ -980,42 +1096,7 @@ class LLMService:
     
     def get_model_limits(self, model):
         """Get practical token limits for different models"""
-        limits = {
-            # OpenAI Models - Updated to current limits (2024)
-            'gpt-4': {'max_tokens': 4000, 'context_window': 8000},
-            'gpt-4-turbo': {'max_tokens': 4000, 'context_window': 128000},
-            'gpt-4o': {'max_tokens': 4000, 'context_window': 128000},
-            'gpt-4o-mini': {'max_tokens': 4000, 'context_window': 128000},
-            'gpt-3.5-turbo': {'max_tokens': 4000, 'context_window': 16000},
-            'o1-preview': {'max_tokens': 32768, 'context_window': 128000},
-            'o1-mini': {'max_tokens': 65536, 'context_window': 128000},
-            
-            # Anthropic Claude Models - High capacity
-            'claude-3-opus': {'max_tokens': 4000, 'context_window': 180000},
-            'claude-3-sonnet': {'max_tokens': 4000, 'context_window': 180000}, 
-            'claude-3-haiku': {'max_tokens': 4000, 'context_window': 180000},
-            'claude-3.5-sonnet': {'max_tokens': 8000, 'context_window': 180000},
-            'claude-sonnet-4-20250514': {'max_tokens': 8000, 'context_window': 180000},
-            'claude-3-5-sonnet-20241022': {'max_tokens': 8000, 'context_window': 180000},
-            
-            # Google Gemini Models - Highest capacity
-            'gemini-pro': {'max_tokens': 8000, 'context_window': 900000},
-            'gemini-flash': {'max_tokens': 8000, 'context_window': 900000},
-            'gemini-1.5-pro': {'max_tokens': 8000, 'context_window': 2000000},
-            'gemini-1.5-flash': {'max_tokens': 8000, 'context_window': 1000000},
-            
-            # Hugging Face Models - Limited
-            'llama2-70b': {'max_tokens': 2000, 'context_window': 3000},
-            'mixtral-8x7b': {'max_tokens': 3000, 'context_window': 30000}, 
-            'codellama-34b': {'max_tokens': 3000, 'context_window': 14000},
-            
-            # Stability AI Models (Image & Audio Generation)
-            'stable-image-ultra': {'max_tokens': 500, 'context_window': 1000},
-            'stable-image-core': {'max_tokens': 500, 'context_window': 1000},
-            'stable-image-sd3': {'max_tokens': 500, 'context_window': 1000},
-            'stable-audio-2': {'max_tokens': 300, 'context_window': 600}
-        }
-        return limits.get(model, {'max_tokens': 2000, 'context_window': 6000})
+        return MODEL_LIMITS.get(model, DEFAULT_MODEL_LIMITS)
     
     def format_conversation_for_llm(self, messages):
         """Convert database messages to LLM API format"""
@@ -1,7 +1,9 @@
+import atexit
 import logging
 import os
+import queue
 from datetime import datetime
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 
 def setup_logging(app):
     """Configure logging for the application"""
@@ -42,9 +44,18 @@ def setup_logging(app):
     error_handler.setLevel(logging.ERROR)
     error_handler.setFormatter(detailed_formatter)
     
+    # Request threads only enqueue records; a background listener thread does
+    # the formatting and file writes so disk I/O never blocks a request
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, file_handler, error_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setLevel(log_level)
+    
     # Add handlers to app logger
-    app.logger.addHandler(file_handler)
-    app.logger.addHandler(error_handler)
+    app.logger.addHandler(queue_handler)
     app.logger.setLevel(log_level)
     
     # Configure specific loggers
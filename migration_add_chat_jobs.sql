@@ -0,0 +1,20 @@
+-- Migration script to add the chat_jobs table for background /chat requests
+-- Run this SQL on your PostgreSQL database
+
+CREATE TABLE IF NOT EXISTS chat_jobs (
+    id UUID PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    model VARCHAR(100) NOT NULL,
+    conversation_id UUID REFERENCES conversations(id) ON DELETE CASCADE,
+    user_id VARCHAR(100),
+    session_id VARCHAR(100),
+    response TEXT,
+    tokens INTEGER,
+    estimated_cost DOUBLE PRECISION,
+    error_message TEXT,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT TIMEZONE('utc', clock_timestamp()),
+    completed_at TIMESTAMP WITHOUT TIME ZONE
+);
+
+-- Verify the migration
+SELECT COUNT(*) AS chat_jobs FROM chat_jobs;
@@ -0,0 +1,25 @@
+-- Migration script to add composite indexes for conversation/message listing
+-- Run this SQL on your PostgreSQL database
+--
+-- CREATE INDEX CONCURRENTLY builds without blocking writes but cannot run
+-- inside a transaction block: run this file with autocommit (plain psql
+-- does this by default; don't wrap it in BEGIN/COMMIT)
+
+-- GET /conversations/<id>/messages: filter on conversation_id, order by timestamp
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_conversation_timestamp
+    ON messages(conversation_id, timestamp);
+
+-- GET /conversations?project_id=...: filter on project_id, order by updated_at
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_conversations_project_updated
+    ON conversations(project_id, updated_at);
+
+-- Refresh planner statistics so the new indexes are picked up immediately
+ANALYZE messages;
+ANALYZE conversations;
+
+-- Verify the migration (expect Index Scan / Index Only Scan, no Sort node)
+EXPLAIN ANALYZE
+SELECT id, role, content, timestamp
+FROM messages
+WHERE conversation_id = (SELECT id FROM conversations LIMIT 1)
+ORDER BY timestamp;
@@ -0,0 +1,44 @@
+-- Migration script to move conversations.context_documents (a JSON list) into
+-- its own conversation_documents table, one row per document
+-- Run this SQL on your PostgreSQL database
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS conversation_documents (
+    id UUID PRIMARY KEY,
+    conversation_id UUID NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    filename TEXT NOT NULL,
+    content TEXT NOT NULL,
+    task_type VARCHAR(50) NOT NULL DEFAULT 'instructions',
+    original_content TEXT,
+    source_type VARCHAR(20) NOT NULL DEFAULT 'file',
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT TIMEZONE('utc', clock_timestamp())
+);
+
+CREATE INDEX IF NOT EXISTS idx_conversation_documents_conversation_created
+    ON conversation_documents(conversation_id, created_at);
+
+-- Copy existing documents, keeping their list order via created_at and
+-- truncating original_content to the 1000-character preview new rows keep
+INSERT INTO conversation_documents
+    (id, conversation_id, filename, content, task_type, original_content, source_type, created_at)
+SELECT
+    gen_random_uuid(),
+    c.id,
+    COALESCE(d.doc->>'filename', 'uploaded file'),
+    d.doc->>'content',
+    COALESCE(d.doc->>'task_type', 'instructions'),
+    LEFT(d.doc->>'original_content', 1000),
+    COALESCE(d.doc->>'source_type', 'file'),
+    COALESCE(c.created_at, TIMEZONE('utc', now())) + d.pos * INTERVAL '1 microsecond'
+FROM conversations c
+CROSS JOIN LATERAL json_array_elements(c.context_documents::json) WITH ORDINALITY AS d(doc, pos)
+WHERE json_typeof(c.context_documents::json) = 'array'
+  AND d.doc->>'content' IS NOT NULL;
+
+ALTER TABLE conversations DROP COLUMN IF EXISTS context_documents;
+
+COMMIT;
+
+-- Verify the migration
+SELECT COUNT(*) AS conversation_documents FROM conversation_documents;
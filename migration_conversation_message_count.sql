@@ -0,0 +1,30 @@
+-- Migration script to store each conversation's message count on the row
+-- Run this SQL on your PostgreSQL database
+--
+-- GET /conversations used to count every listed conversation's messages
+-- with a correlated subquery (an index scan over all of its messages per
+-- row). The app now keeps conversations.message_count up to date in the
+-- same UPDATE that bumps updated_at whenever messages are inserted.
+--
+-- Run this while the app is stopped (or right before deploying the new
+-- code), so no message is inserted between the backfill and the switch.
+
+ALTER TABLE conversations
+    ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 0;
+
+-- Backfill from the existing messages
+UPDATE conversations c
+SET message_count = m.n
+FROM (
+    SELECT conversation_id, count(*) AS n
+    FROM messages
+    GROUP BY conversation_id
+) m
+WHERE m.conversation_id = c.id;
+
+-- Verify the migration (expect no rows)
+SELECT c.id, c.message_count, count(m.id) AS actual
+FROM conversations c
+LEFT JOIN messages m ON m.conversation_id = c.id
+GROUP BY c.id, c.message_count
+HAVING c.message_count <> count(m.id);
@@ -0,0 +1,28 @@
+-- Migration script to index LLM usage logs for the usage dashboards
+-- Run this SQL on your PostgreSQL database
+--
+-- /llm-usage-stats, /monthly-token-usage and /session-token-usage filter
+-- llm_usage_logs on a timestamp range and group by model; without an index
+-- each call scans the whole table. The range predicate is on the bare
+-- column, so the ::date / extract() bucketing in GROUP BY doesn't stop the
+-- planner using the index and no expression index is needed. tokens and
+-- estimated_cost are INCLUDEd so the sums come from an Index Only Scan.
+--
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block: run this
+-- file with autocommit (plain psql does this by default)
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_llm_usage_logs_timestamp_model
+    ON llm_usage_logs(timestamp, model) INCLUDE (tokens, estimated_cost);
+
+-- Refresh planner statistics and the visibility map (index-only scans)
+VACUUM ANALYZE llm_usage_logs;
+
+-- Verify the migration (expect Index Only Scan on
+-- idx_llm_usage_logs_timestamp_model)
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT CAST(timestamp AS DATE) AS date, model, count(*),
+       coalesce(sum(tokens), 0), coalesce(sum(estimated_cost), 0.0)
+FROM llm_usage_logs
+WHERE timestamp >= current_date - 13
+GROUP BY date, model
+ORDER BY date;
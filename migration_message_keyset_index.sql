@@ -0,0 +1,35 @@
+-- Migration script to extend the message history index with the id tiebreaker
+-- Run this SQL on your PostgreSQL database
+--
+-- Message pages are ordered by (timestamp, id) and paginated with a
+-- (timestamp, id) > cursor comparison. With id as the last index column
+-- Postgres walks the index in that order directly instead of sorting ties.
+--
+-- role/content are deliberately not INCLUDEd: content is unbounded TEXT and
+-- a btree entry can't exceed ~2.7kB, so long messages would fail to insert.
+--
+-- CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block: run
+-- this file with autocommit (plain psql does this by default)
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_conversation_timestamp_id
+    ON messages(conversation_id, timestamp, id);
+
+-- Superseded: the new index serves everything this one did
+DROP INDEX CONCURRENTLY IF EXISTS idx_messages_conversation_timestamp;
+
+-- Refresh planner statistics and the visibility map (index-only scans)
+VACUUM ANALYZE messages;
+
+-- Verify the migration (expect Index Scan, no Sort node)
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT id, role, content, timestamp
+FROM messages
+WHERE conversation_id = (SELECT id FROM conversations LIMIT 1)
+ORDER BY timestamp, id
+LIMIT 50;
+
+-- Per-conversation counts should be an Index Only Scan with Heap Fetches: 0
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT count(*)
+FROM messages
+WHERE conversation_id = (SELECT id FROM conversations LIMIT 1);
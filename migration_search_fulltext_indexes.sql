@@ -0,0 +1,32 @@
+-- Migration script to index conversation search
+-- Run this SQL on your PostgreSQL database
+--
+-- /api/search/conversations matches queries of three or more characters with
+-- to_tsvector('english', ...) @@ websearch_to_tsquery(...) on
+-- conversations.title and messages.content. These GIN expression indexes let
+-- the planner answer that with a Bitmap Index Scan instead of scanning (and
+-- tokenizing) every row. The indexed expressions must stay identical to the
+-- ones in app.py (SEARCH_TS_CONFIG, SEARCH_INDEXED_CHARS) or the planner
+-- won't use them. Shorter queries still use ILIKE and are not indexed.
+--
+-- Only the first 100000 characters of a message are indexed: Postgres
+-- rejects tsvectors over 1MB ("string is too long for tsvector"), so an
+-- unbounded expression could fail this CREATE INDEX on existing data and
+-- every later INSERT of a very large message.
+--
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block: run this
+-- file with autocommit (plain psql does this by default)
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_conversations_title_fts
+    ON conversations USING gin (to_tsvector('english'::regconfig, title));
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_content_fts
+    ON messages USING gin (to_tsvector('english'::regconfig, left(content, 100000)));
+
+ANALYZE conversations;
+ANALYZE messages;
+
+-- Verify the migration (expect Bitmap Index Scan on idx_messages_content_fts)
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT conversation_id FROM messages
+WHERE to_tsvector('english'::regconfig, left(content, 100000)) @@ websearch_to_tsquery('english'::regconfig, 'hello');
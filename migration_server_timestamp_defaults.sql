@@ -0,0 +1,50 @@
+-- Migration script to move timestamp defaults from the application to the database
+-- Run this SQL on your PostgreSQL database
+--
+-- Columns stay TIMESTAMP WITHOUT TIME ZONE holding UTC, matching the values
+-- previously written with Python's datetime.utcnow()
+
+ALTER TABLE projects
+    ALTER COLUMN created_at SET DEFAULT TIMEZONE('utc', clock_timestamp()),
+    ALTER COLUMN updated_at SET DEFAULT TIMEZONE('utc', clock_timestamp());
+
+ALTER TABLE conversations
+    ALTER COLUMN created_at SET DEFAULT TIMEZONE('utc', clock_timestamp()),
+    ALTER COLUMN updated_at SET DEFAULT TIMEZONE('utc', clock_timestamp());
+
+ALTER TABLE messages
+    ALTER COLUMN timestamp SET DEFAULT TIMEZONE('utc', clock_timestamp());
+
+-- Attachments are inserted alongside their messages, so both need the same
+-- clock
+ALTER TABLE attachments
+    ALTER COLUMN created_at SET DEFAULT TIMEZONE('utc', clock_timestamp());
+
+ALTER TABLE search_queries
+    ALTER COLUMN created_at SET DEFAULT TIMEZONE('utc', clock_timestamp());
+
+ALTER TABLE ip_whitelist
+    ALTER COLUMN created_at SET DEFAULT TIMEZONE('utc', clock_timestamp());
+
+ALTER TABLE context_items
+    ALTER COLUMN created_at SET DEFAULT TIMEZONE('utc', clock_timestamp()),
+    ALTER COLUMN updated_at SET DEFAULT TIMEZONE('utc', clock_timestamp());
+
+ALTER TABLE context_usage_logs
+    ALTER COLUMN created_at SET DEFAULT TIMEZONE('utc', clock_timestamp());
+
+ALTER TABLE context_templates
+    ALTER COLUMN created_at SET DEFAULT TIMEZONE('utc', clock_timestamp()),
+    ALTER COLUMN updated_at SET DEFAULT TIMEZONE('utc', clock_timestamp());
+
+ALTER TABLE context_analytics
+    ALTER COLUMN created_at SET DEFAULT TIMEZONE('utc', clock_timestamp());
+
+-- Verify the migration
+SELECT table_name, column_name, column_default
+FROM information_schema.columns
+WHERE table_name IN ('projects', 'conversations', 'messages', 'attachments', 'search_queries',
+                     'ip_whitelist', 'context_items', 'context_usage_logs', 'context_templates',
+                     'context_analytics')
+  AND column_name IN ('created_at', 'updated_at', 'timestamp')
+ORDER BY table_name, column_name;
@@ -1,16 +1,54 @@
 from database import db
 from datetime import datetime
+from sqlalchemy import DateTime
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
 import uuid
 
+class utcnow(FunctionElement):
+    """Current UTC time as a naive timestamp, evaluated by the database.
+    
+    Timestamp columns are naive UTC (they used to be filled with
+    datetime.utcnow()), so Postgres must not apply the session time zone.
+    clock_timestamp() rather than now() keeps rows written in the same
+    transaction in insertion order, as the Python clock did.
+    """
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    return 'CURRENT_TIMESTAMP'
+
+@compiles(utcnow, 'sqlite')
+def _utcnow_sqlite(element, compiler, **kw):
+    # Same text format SQLAlchemy's SQLite DateTime stores, so server- and
+    # client-side values compare correctly (and with sub-second precision)
+    return "STRFTIME('%Y-%m-%d %H:%M:%f000', 'now')"
+
+@compiles(utcnow, 'postgresql')
+def _utcnow_postgresql(element, compiler, **kw):
+    return "TIMEZONE('utc', clock_timestamp())"
+
 class Project(db.Model):
     __tablename__ = 'projects'
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=utcnow())
+    updated_at = db.Column(db.DateTime, server_default=utcnow(), onupdate=utcnow())
     conversations = db.relationship('Conversation', backref='project', lazy=True, cascade='all, delete-orphan')
+    
+    def to_dict(self):
+        # UUIDs and datetimes are left for the JSON provider to serialize
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
 
 class Conversation(db.Model):
     __tablename__ = 'conversations'
@@ -18,15 +56,25 @@ class Conversation(db.Model):
     project_id = db.Column(UUID(as_uuid=True), db.ForeignKey('projects.id'), nullable=True)  # New field
     title = db.Column(db.String(255), nullable=False)
     llm_model = db.Column(db.String(100), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=utcnow())
+    updated_at = db.Column(db.DateTime, server_default=utcnow(), onupdate=utcnow())
     tags = db.Column(db.JSON, default=list)
-    context_documents = db.Column(db.JSON, default=list)  # New: stores uploaded context docs as list of dicts
+    # Denormalized so list endpoints don't count messages per row; bumped in
+    # the same statement as updated_at wherever messages are inserted
+    message_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     # User identification fields
     user_id = db.Column(db.String(100), nullable=True)  # For authenticated users
     session_id = db.Column(db.String(100), nullable=True)  # For free/anonymous users
     ip_address = db.Column(db.String(45), nullable=True)  # Additional tracking for free users
-    messages = db.relationship('Message', backref='conversation', lazy=True, cascade='all, delete-orphan')
+    messages = db.relationship('Message', backref='conversation', lazy=True, cascade='all, delete-orphan',
+                               order_by='Message.timestamp')
+    documents = db.relationship('ContextDocument', backref='conversation', lazy=True, cascade='all, delete-orphan',
+                                order_by='ContextDocument.created_at')
+    
+    __table_args__ = (
+        # Project-filtered conversation list, newest first
+        db.Index('idx_conversations_project_updated', 'project_id', 'updated_at'),
+    )
 
 class Message(db.Model):
     __tablename__ = 'messages'
@@ -36,9 +84,15 @@ class Message(db.Model):
     role = db.Column(db.String(20), nullable=False)  # 'user' or 'assistant'
     content = db.Column(db.Text, nullable=False)
     # embeddings = db.Column(Vector(1536))  # Will add back with pgvector
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, server_default=utcnow())
     
     attachments = db.relationship('Attachment', backref='message', lazy=True, cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        # Conversation history in (timestamp, id) keyset order (and
+        # per-conversation counts)
+        db.Index('idx_messages_conversation_timestamp_id', 'conversation_id', 'timestamp', 'id'),
+    )
 
 class Attachment(db.Model):
     __tablename__ = 'attachments'
@@ -49,7 +103,28 @@ class Attachment(db.Model):
     content_type = db.Column(db.String(100), nullable=False)
     file_path = db.Column(db.String(500), nullable=False)
     processed_content = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=utcnow())
+
+class ContextDocument(db.Model):
+    """A document/URL attached to a conversation via /upload-context or /extract-url.
+    
+    One row per document (formerly a JSON list on conversations), so adding a
+    document is a single INSERT instead of rewriting every earlier one.
+    """
+    __tablename__ = 'conversation_documents'
+    
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    conversation_id = db.Column(UUID(as_uuid=True), db.ForeignKey('conversations.id', ondelete='CASCADE'), nullable=False)
+    filename = db.Column(db.Text, nullable=False)  # File name, or the URL for source_type='url'
+    content = db.Column(db.Text, nullable=False)  # Task-processed text sent to the LLM
+    task_type = db.Column(db.String(50), nullable=False, default='instructions')
+    original_content = db.Column(db.Text)  # Truncated preview of the extracted text
+    source_type = db.Column(db.String(20), nullable=False, default='file')  # 'file' or 'url'
+    created_at = db.Column(db.DateTime, server_default=utcnow())
+    
+    __table_args__ = (
+        db.Index('idx_conversation_documents_conversation_created', 'conversation_id', 'created_at'),
+    )
 
 class SearchQuery(db.Model):
     __tablename__ = 'search_queries'
@@ -58,7 +133,7 @@ class SearchQuery(db.Model):
     query_text = db.Column(db.Text, nullable=False)
     # query_embedding = db.Column(Vector(1536))  # Will add back with pgvector
     results_count = db.Column(db.Integer, default=0)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=utcnow())
 
 class LLMUsageLog(db.Model):
     __tablename__ = 'llm_usage_logs'
@@ -68,6 +143,13 @@ class LLMUsageLog(db.Model):
     tokens = db.Column(db.Integer, nullable=True)
     estimated_cost = db.Column(db.Float, nullable=True)
     conversation_id = db.Column(UUID(as_uuid=True), db.ForeignKey('conversations.id'), nullable=True)
+    
+    __table_args__ = (
+        # Usage dashboards: time-range filter grouped by model. tokens/cost
+        # are INCLUDEd so the aggregates are answered from the index alone
+        db.Index('idx_llm_usage_logs_timestamp_model', 'timestamp', 'model',
+                 postgresql_include=['tokens', 'estimated_cost']),
+    )
 
 class LLMErrorLog(db.Model):
     __tablename__ = 'llm_error_logs'
@@ -77,6 +159,23 @@ class LLMErrorLog(db.Model):
     error_message = db.Column(db.Text, nullable=False)
     conversation_id = db.Column(UUID(as_uuid=True), db.ForeignKey('conversations.id'), nullable=True)
 
+class ChatJob(db.Model):
+    """A /chat request running in the background; polled via GET /chat/jobs/<id>"""
+    __tablename__ = 'chat_jobs'
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, completed, failed
+    model = db.Column(db.String(100), nullable=False)
+    conversation_id = db.Column(UUID(as_uuid=True), db.ForeignKey('conversations.id', ondelete='CASCADE'), nullable=True)
+    # Owner, matched against the poller's identity
+    user_id = db.Column(db.String(100), nullable=True)
+    session_id = db.Column(db.String(100), nullable=True)
+    response = db.Column(db.Text, nullable=True)
+    tokens = db.Column(db.Integer, nullable=True)
+    estimated_cost = db.Column(db.Float, nullable=True)
+    error_message = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, server_default=utcnow())
+    completed_at = db.Column(db.DateTime, nullable=True)
+
 class FreeAccessLog(db.Model):
     __tablename__ = 'free_access_logs'
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -100,7 +199,7 @@ class IPWhitelist(db.Model):
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     ip_address = db.Column(db.String(45), nullable=False, unique=True, index=True)
     description = db.Column(db.String(255), nullable=True)  # e.g., "Demo office", "John's home"
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=utcnow())
     created_by = db.Column(db.String(100), nullable=True)  # Who added this IP
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     
@@ -134,8 +233,8 @@ class ContextItem(db.Model):
     original_filename = db.Column(db.String(255))
     file_size = db.Column(db.Integer)
     token_count = db.Column(db.Integer, default=0)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=utcnow())
+    updated_at = db.Column(db.DateTime, server_default=utcnow())
     last_used_at = db.Column(db.DateTime)
     usage_count = db.Column(db.Integer, default=0)
     is_active = db.Column(db.Boolean, default=True)
@@ -166,7 +265,7 @@ class ContextUsageLog(db.Model):
     usage_type = db.Column(db.String(50), nullable=False)  # 'input', 'reference', 'citation'
     influence_score = db.Column(db.Numeric(3, 2), default=0.0)  # How much this context influenced response
     tokens_consumed = db.Column(db.Integer, default=0)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=utcnow())
     
     # Relationships
     conversation = db.relationship('Conversation', backref='context_usage_logs')
@@ -182,8 +281,8 @@ class ContextTemplate(db.Model):
     context_items = db.Column(db.JSON, nullable=False)  # Array of context_item_ids
     is_public = db.Column(db.Boolean, default=False)
     usage_count = db.Column(db.Integer, default=0)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=utcnow())
+    updated_at = db.Column(db.DateTime, server_default=utcnow())
 
 class ContextAnalytics(db.Model):
     __tablename__ = 'context_analytics'
@@ -194,7 +293,7 @@ class ContextAnalytics(db.Model):
     items_used = db.Column(db.Integer, default=0)
     total_tokens_consumed = db.Column(db.Integer, default=0)
     most_used_item_id = db.Column(UUID(as_uuid=True), db.ForeignKey('context_items.id', ondelete='SET NULL'))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=utcnow())
     
     # Relationships
     most_used_item = db.relationship('ContextItem', backref='analytics_records')
@@ -40,7 +40,9 @@ def get_user_identity():
         }
 
 def validate_uuid(uuid_string):
-    """Validate UUID format"""
+    """Validate UUID format (UUID objects from <uuid:...> routes pass as-is)"""
+    if isinstance(uuid_string, uuid.UUID):
+        return True
     try:
         uuid.UUID(uuid_string)
         return True
@@ -95,7 +97,7 @@ def check_message_access(message_id, user_identity=None):
             return False, "Message not found"
         
         # Check access via conversation
-        return check_conversation_access(str(message.conversation_id), user_identity)
+        return check_conversation_access(message.conversation_id, user_identity)
         
     except Exception as e:
         security_logger.error(f"Error checking message access: {e}")
@@ -119,7 +121,7 @@ def check_project_access(project_id, user_identity=None):
         conversations = Conversation.query.filter_by(project_id=project_id).all()
         
         for conv in conversations:
-            has_access, _ = check_conversation_access(str(conv.id), user_identity)
+            has_access, _ = check_conversation_access(conv.id, user_identity)
             if has_access:
                 return True, "Access granted"
         
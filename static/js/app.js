@@ -599,6 +599,7 @@ class KnowledgeBaseApp {
         
         container.appendChild(messageDiv);
         this.scrollToBottom();
+        return messageDiv;
     }
 
     formatMessageContent(content) {
@@ -646,20 +647,41 @@ class KnowledgeBaseApp {
             // Save user message
             await this.saveMessage('user', content);
 
-            // Get AI response (placeholder for now)
-            const aiResponse = await this.getAIResponse(content);
-            
-            // Save AI message
-            await this.saveMessage('assistant', aiResponse);
-
-            // Add AI message to chat
-            this.hideTypingIndicator();
+            // Get AI response, rendering it as it streams in
             const aiMessage = {
                 role: 'assistant',
-                content: aiResponse,
+                content: '',
                 timestamp: new Date().toISOString()
             };
-            this.addMessageToChat(aiMessage);
+            let messageDiv = null;
+            let renderPending = false;
+            const aiResponse = await this.getAIResponse(content, (partial) => {
+                aiMessage.content = partial;
+                if (!messageDiv) {
+                    this.hideTypingIndicator();
+                    messageDiv = this.addMessageToChat(aiMessage);
+                    return;
+                }
+                // Re-render at most once per frame however fast tokens arrive
+                if (renderPending) return;
+                renderPending = true;
+                requestAnimationFrame(() => {
+                    renderPending = false;
+                    this.updateMessageContent(messageDiv, aiMessage.content);
+                });
+            });
+
+            // Add AI message to chat (or finish the streamed one)
+            this.hideTypingIndicator();
+            aiMessage.content = aiResponse;
+            if (messageDiv) {
+                this.updateMessageContent(messageDiv, aiResponse);
+            } else {
+                this.addMessageToChat(aiMessage);
+            }
+            
+            // Save AI message
+            await this.saveMessage('assistant', aiResponse);
 
         } catch (error) {
             this.hideTypingIndicator();
@@ -712,7 +734,49 @@ class KnowledgeBaseApp {
         });
     }
 
-    async getAIResponse(userMessage) {
+    updateMessageContent(messageDiv, content) {
+        const contentDiv = messageDiv.querySelector('.message-content');
+        const timeDiv = contentDiv.querySelector('.message-time');
+        contentDiv.innerHTML = this.formatMessageContent(content);
+        contentDiv.appendChild(timeDiv);
+        this.scrollToBottom();
+    }
+
+    async readChatStream(response, onDelta) {
+        // /chat with stream: true replies with Server-Sent Events:
+        // {type: 'delta', content} ... then {type: 'done'} or {type: 'error'}
+        if (!response.ok) {
+            const data = await response.json().catch(() => ({}));
+            throw new Error(data.error || `HTTP error! status: ${response.status}`);
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            for (const event of events) {
+                if (!event.startsWith('data: ')) continue;
+                const data = JSON.parse(event.slice(6));
+                if (data.type === 'delta') {
+                    text += data.content;
+                    if (onDelta) onDelta(text);
+                } else if (data.type === 'error') {
+                    throw new Error(data.error);
+                } else if (data.type === 'done' && data.free_access) {
+                    // Update free access indicator if present
+                    this.updateUsageIndicator(data.free_access);
+                }
+            }
+        }
+        return text;
+    }
+
+    async getAIResponse(userMessage, onDelta) {
         try {
             // Check if we have a Stability AI model and an uploaded image
             const stabilityModels = [
@@ -738,23 +802,13 @@ class KnowledgeBaseApp {
                     body: JSON.stringify({
                         message: userMessage,
                         model: this.selectedModel,
-                        conversation_id: this.currentConversationId
+                        conversation_id: this.currentConversationId,
+                        stream: true
                     })
                 });
 
-                const data = await response.json();
-                
-                // Check for API errors (backend returns 500 with error details)
-                if (!response.ok || data.error) {
-                    throw new Error(data.error || `HTTP error! status: ${response.status}`);
-                }
-                
-                // Update free access indicator if present
-                if (data.free_access) {
-                    this.updateUsageIndicator(data.free_access);
-                }
-                
-                return data.response;
+                // Errors before streaming starts come back as JSON (e.g. 400/500)
+                return await this.readChatStream(response, onDelta);
             }
             
         } catch (error) {
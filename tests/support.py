@@ -0,0 +1,43 @@
+"""
+Shared test setup: the app on TestingConfig (in-memory SQLite unless
+TEST_DATABASE_URL is set), with CSRF and rate limits off.
+
+Run the suite from the repository root with:
+    python -m unittest discover -s tests -t .
+"""
+import os
+import unittest
+
+os.environ.setdefault('FLASK_CONFIG', 'testing')
+
+import app as app_module  # noqa: E402
+from app import app, db  # noqa: E402
+
+
+class AppTestCase(unittest.TestCase):
+    """Fresh tables and a test client with an anonymous session per test"""
+
+    session_id = 'test-session'
+
+    def setUp(self):
+        app.config.update(WTF_CSRF_ENABLED=False, RATELIMIT_ENABLED=False)
+        with app.app_context():
+            db.create_all()
+        self.client = self.make_client(self.session_id)
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    @staticmethod
+    def make_client(session_id=None):
+        client = app.test_client()
+        if session_id is not None:
+            client.set_cookie('session_id', session_id)
+        return client
+
+    def create_conversation(self, client=None):
+        response = (client or self.client).post('/conversations', json={'title': 'Test', 'llm_model': 'gpt-4'})
+        self.assertEqual(response.status_code, 201, response.get_data(as_text=True))
+        return response.get_json()['id']
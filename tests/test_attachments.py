@@ -0,0 +1,43 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from tests.support import AppTestCase, app_module
+
+
+class UploadAttachmentsTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload_dir = tempfile.mkdtemp()
+        patcher = mock.patch.object(app_module, 'UPLOAD_FOLDER', self.upload_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.upload_dir)
+
+    def upload(self, conversation_id, filename):
+        response = self.client.post(
+            f'/conversations/{conversation_id}/attachments',
+            data={'files': (io.BytesIO(b'hello'), filename)},
+            content_type='multipart/form-data'
+        )
+        self.assertEqual(response.status_code, 201, response.get_data(as_text=True))
+        return response.get_json()['attachments'][0]
+
+    def test_keeps_user_filename_and_suffixes_only_on_disk(self):
+        conversation_id = self.create_conversation()
+        first = self.upload(conversation_id, 'report.txt')
+        second = self.upload(conversation_id, 'report.txt')
+
+        self.assertEqual(first['filename'], 'report.txt')
+        self.assertEqual(second['filename'], 'report.txt')
+        self.assertEqual(os.path.basename(first['file_path']), 'report.txt')
+        self.assertNotEqual(first['file_path'], second['file_path'])
+        stored = os.listdir(self.upload_dir)
+        self.assertIn('report.txt', stored)
+        self.assertEqual(len(stored), 2)
+
+        messages = self.client.get(f'/conversations/{conversation_id}/messages').get_json()['messages']
+        contents = [message['content'] for message in messages]
+        self.assertEqual(contents.count('[File uploaded: report.txt]'), 2)
@@ -0,0 +1,46 @@
+from unittest import mock
+
+from tests.support import AppTestCase, app_module
+
+
+def free_identity(session_id):
+    return {'type': 'free', 'user_id': None, 'session_id': session_id}
+
+
+class ChatJobOwnershipTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        # Only job ownership is under test; don't run the LLM call
+        patcher = mock.patch.object(app_module.chat_job_executor, 'submit')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def as_identity(self, identity):
+        return mock.patch.object(app_module, 'get_user_identity', return_value=identity)
+
+    def enqueue(self, identity):
+        with self.as_identity(identity):
+            response = self.client.post('/chat', json={'model': 'gpt-4', 'message': 'hi', 'background': True})
+        self.assertEqual(response.status_code, 202, response.get_data(as_text=True))
+        return response.get_json()['status_url']
+
+    def poll(self, status_url, identity):
+        with self.as_identity(identity):
+            return self.client.get(status_url).status_code
+
+    def test_owner_can_poll_its_job(self):
+        status_url = self.enqueue(free_identity('session-a'))
+        self.assertEqual(self.poll(status_url, free_identity('session-a')), 202)
+
+    def test_other_session_cannot_poll_job(self):
+        status_url = self.enqueue(free_identity('session-a'))
+        self.assertEqual(self.poll(status_url, free_identity('session-b')), 404)
+
+    def test_sessionless_callers_cannot_poll_each_others_jobs(self):
+        status_url = self.enqueue(free_identity(None))
+        self.assertEqual(self.poll(status_url, free_identity(None)), 404)
+
+    def test_authenticated_user_cannot_poll_sessionless_job(self):
+        status_url = self.enqueue(free_identity(None))
+        identity = {'type': 'authenticated', 'user_id': None, 'session_id': None}
+        self.assertEqual(self.poll(status_url, identity), 404)
@@ -0,0 +1,59 @@
+import io
+import threading
+import time
+import unittest
+from unittest import mock
+
+import document_service
+
+
+def slow_extractor(path, limit):
+    time.sleep(10)
+    return 'slow'
+
+
+def echo_extractor(path, limit):
+    with open(path) as f:
+        return f.read()[:limit]
+
+
+def steady_extractor(path, limit):
+    time.sleep(1.5)
+    return echo_extractor(path, limit)
+
+
+def failing_extractor(path, limit):
+    raise ValueError('not a PDF')
+
+
+class RunExtractionTest(unittest.TestCase):
+    def test_returns_extractor_text(self):
+        self.assertEqual(document_service.run_extraction(echo_extractor, io.BytesIO(b'hello world'), 5), 'hello')
+
+    def test_extractor_error_is_raised(self):
+        with self.assertRaisesRegex(document_service.ExtractionError, 'ValueError: not a PDF'):
+            document_service.run_extraction(failing_extractor, io.BytesIO(b'x'), 10)
+
+    def test_timeout_only_fails_the_slow_extraction(self):
+        results = {}
+
+        def run(name, extractor):
+            try:
+                results[name] = document_service.run_extraction(extractor, io.BytesIO(b'fine'), 10)
+            except Exception as e:
+                results[name] = e
+
+        with mock.patch.object(document_service, 'EXTRACTION_TIMEOUT', 2):
+            slow = threading.Thread(target=run, args=('slow', slow_extractor))
+            slow.start()
+            time.sleep(1)
+            # Still running on the other slot when the slow one is killed
+            fast = threading.Thread(target=run, args=('fast', steady_extractor))
+            fast.start()
+            slow.join()
+            fast.join()
+            # Both slots are free again afterwards
+            self.assertEqual(document_service.run_extraction(echo_extractor, io.BytesIO(b'after'), 10), 'after')
+
+        self.assertIsInstance(results['slow'], TimeoutError)
+        self.assertEqual(results['fast'], 'fine')
@@ -0,0 +1,47 @@
+from unittest import mock
+
+from tests.support import AppTestCase, app_module
+
+
+class FakeResponse:
+    """Streamed requests.Response stand-in"""
+
+    def __init__(self, body, headers=None):
+        self.body = body
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class ExtractUrlEncodingTest(AppTestCase):
+    def extract(self, body, headers):
+        conversation_id = self.create_conversation()
+        with mock.patch.object(app_module.url_fetch_session, 'get', return_value=FakeResponse(body, headers)):
+            response = self.client.post('/extract-url', json={
+                'url': 'https://example.test/page', 'conversation_id': conversation_id
+            })
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        return response.get_json()
+
+    def test_header_charset_without_meta(self):
+        body = '<html><head><title>Café</title></head><body><p>Grüße aus Köln</p></body></html>'.encode('utf-8')
+        data = self.extract(body, {'content-type': 'text/html; charset=utf-8'})
+        self.assertEqual(data['title'], 'Café')
+        self.assertIn('Grüße aus Köln', data['preview'])
+
+    def test_meta_charset_without_header_charset(self):
+        body = ('<html><head><meta charset="windows-1252"><title>x</title></head>'
+                '<body><p>caf\xe9</p></body></html>').encode('cp1252')
+        data = self.extract(body, {'content-type': 'text/html'})
+        self.assertIn('café', data['preview'])
@@ -0,0 +1,58 @@
+import io
+import uuid
+from types import SimpleNamespace
+from unittest import mock
+
+from tests.support import AppTestCase, app, app_module, db
+
+
+class UploadContextLegacyFlagTest(AppTestCase):
+    def upload(self, conversation_id):
+        response = self.client.post('/upload-context', data={
+            'conversation_id': conversation_id,
+            'task_type': 'reference',
+            'file': (io.BytesIO(b'Quarterly numbers are up.'), 'notes.txt')
+        }, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+
+    def legacy_documents(self, conversation_id):
+        with app.app_context():
+            return db.session.query(app_module.ContextDocument).filter_by(
+                conversation_id=uuid.UUID(conversation_id)
+            ).all()
+
+    def context_service_succeeds(self):
+        service = mock.patch.multiple(
+            app_module.ContextService,
+            create_context_item=mock.Mock(return_value=SimpleNamespace(id=uuid.uuid4())),
+            add_context_to_conversation=mock.Mock()
+        )
+        service.start()
+        self.addCleanup(service.stop)
+
+    def test_flag_off_writes_no_legacy_copy(self):
+        self.context_service_succeeds()
+        conversation_id = self.create_conversation()
+        with mock.patch.dict(app.config, USE_LEGACY_CONTEXT=False):
+            self.upload(conversation_id)
+        self.assertEqual(self.legacy_documents(conversation_id), [])
+
+    def test_flag_on_also_writes_legacy_copy(self):
+        self.context_service_succeeds()
+        conversation_id = self.create_conversation()
+        with mock.patch.dict(app.config, USE_LEGACY_CONTEXT=True):
+            self.upload(conversation_id)
+        self.assertEqual([doc.filename for doc in self.legacy_documents(conversation_id)], ['notes.txt'])
+
+    def test_flag_off_still_reads_fallback_documents(self):
+        conversation_id = self.create_conversation()
+        with mock.patch.dict(app.config, USE_LEGACY_CONTEXT=False), \
+                mock.patch.object(app_module.ContextService, 'create_context_item', side_effect=RuntimeError('down')):
+            self.upload(conversation_id)
+        self.assertEqual(len(self.legacy_documents(conversation_id)), 1)
+
+        with app.app_context(), \
+                mock.patch.object(app_module.ContextService, 'get_conversation_context', return_value=[]):
+            conversation = db.session.get(app_module.Conversation, uuid.UUID(conversation_id))
+            prompt = app_module.build_context_prompt(conversation, conversation_id)
+        self.assertIn('Quarterly numbers are up.', prompt)